@@ -5,6 +5,11 @@ from psycopg2.extras import RealDictCursor
 from uuid import UUID
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+import time
+
+# Запуск из backend_old: uvicorn Bronka63.models:app
+from db_with_psycopg.db_control import InstrumentedConnection, db_stats
 app = FastAPI()
 origins = ["*"]
 
@@ -17,16 +22,25 @@ app.add_middleware(
 )
 # Подключение к базе данных
 def get_db_connection():
+    started = time.perf_counter()
     conn = psycopg2.connect(
         dbname="fast_api",
         user="postgres",
         password="password",
         host="localhost",
         port = "5433",
-        cursor_factory=RealDictCursor
+        cursor_factory=RealDictCursor,
+        connection_factory=InstrumentedConnection
     )
+    db_stats.record_acquire(time.perf_counter() - started)
     return conn
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Счётчики работы с базой (db_control.db_stats) в формате Prometheus"""
+    return db_stats.render()
+
 # Модели Pydantic для валидации данных
 class User(BaseModel):
     name: str
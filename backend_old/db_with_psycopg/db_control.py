@@ -1,9 +1,246 @@
+import json
+import logging
+import random
+import re
+import threading
+import time as _time
+from collections import OrderedDict, deque
+
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
-from typing import Optional, Dict, List
+from typing import Any, Hashable, Optional, Dict, List
 from datetime import date, time
 from uuid import UUID
 
+
+class EntityCache:
+    """Кэш редко меняющихся строк (пользователи, кабинеты) с TTL и LRU-вытеснением.
+
+    Ключи — кортежи вида ("user", id). Обработчики записи обязаны обновлять
+    или удалять свои ключи после коммита, TTL страхует от пропущенных случаев.
+    ttl=None — записи не устаревают по времени (ключ сам несёт версию).
+    Тот же класс (копией) используется в backend_old/db_with_psycopg/db_control.py
+    и prototype_app/backend/entity_cache.py; менять оба вместе.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: Optional[float] = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Синхронный код на psycopg2 (backend_old) обращается к кэшу из нескольких потоков
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires < _time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        expires = _time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys: Hashable):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+entity_cache = EntityCache()
+
+
+class QueryStats:
+    """Счётчики работы с базой: соединения, запросы, время и строки"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.acquire_seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+
+    def record_acquire(self, seconds: float):
+        with self._lock:
+            self.connections += 1
+            self.acquire_seconds += seconds
+
+    def record_query(self, seconds: float, rows: int):
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+            self.rows += max(rows, 0)
+
+    def render(self) -> str:
+        """Те же счётчики в текстовом формате Prometheus (для /metrics)"""
+        with self._lock:
+            values = {
+                "db_connections_total": self.connections,
+                "db_connection_acquire_seconds_total": self.acquire_seconds,
+                "db_queries_total": self.queries,
+                "db_query_seconds_total": self.query_seconds,
+                "db_rows_total": self.rows,
+            }
+        return "".join(f"# TYPE {name} counter\n{name} {value}\n" for name, value in values.items())
+
+
+db_stats = QueryStats()
+
+# Запросы дольше порога пишутся в лог и в slow_queries; 0 — выключено
+SLOW_QUERY_MS = 200.0
+# Доля медленных SELECT, для которых в фоне на отдельном соединении снимается
+# EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON); 0 — не снимать. Одновременно
+# снимается не больше одного плана
+SLOW_QUERY_EXPLAIN_RATE = 0.0
+slow_queries = deque(maxlen=200)
+slow_logger = logging.getLogger("db_control.slow")
+_explaining = threading.Lock()
+
+_WRITES = re.compile(r"\b(insert|update|delete)\b", re.IGNORECASE)
+
+
+def _normalize_sql(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode()
+    return " ".join(re.sub(r"--[^\n]*", " ", str(query)).split())
+
+
+def _redact(sql: str, vars):
+    """Позиционные параметры не подписаны, поэтому в запросах с паролем
+    замазываются все строковые значения"""
+    if vars is None:
+        return None
+    secret = "password" in sql.lower()
+    if isinstance(vars, dict):
+        return {k: "***" if "password" in k.lower() else str(v) for k, v in vars.items()}
+    return ["***" if secret and isinstance(v, str) else str(v) for v in vars]
+
+
+class InstrumentedCursorMixin:
+    def execute(self, query, vars=None):
+        started = _time.perf_counter()
+        succeeded = False
+        try:
+            result = super().execute(query, vars)
+            succeeded = True
+            return result
+        finally:
+            duration = _time.perf_counter() - started
+            db_stats.record_query(duration, self.rowcount)
+            if SLOW_QUERY_MS and duration * 1000 >= SLOW_QUERY_MS:
+                self._log_slow(query, vars, duration, succeeded)
+
+    def _log_slow(self, query, vars, duration: float, succeeded: bool):
+        """Ошибки журнала не должны подменять результат запроса"""
+        try:
+            sql = _normalize_sql(query)
+            entry = {"duration_ms": round(duration * 1000, 2), "sql": sql,
+                     "params": _redact(sql, vars), "plan": None}
+            slow_logger.warning("Медленный запрос %.1f мс: %s %s", entry["duration_ms"], sql, entry["params"])
+            slow_queries.append(entry)
+            params = getattr(self.connection, "explain_params", None)
+            if (params and succeeded and not _WRITES.search(sql)
+                    and random.random() < SLOW_QUERY_EXPLAIN_RATE):
+                # Исходный текст с подставленными параметрами: mogrify работает
+                # на клиенте и не трогает транзакцию вызывающего
+                statement = self.mogrify(query, vars)
+                if _explaining.acquire(blocking=False):
+                    threading.Thread(target=_capture_plan, args=(entry, params, statement),
+                                     daemon=True).start()
+        except Exception:
+            slow_logger.exception("Не удалось записать медленный запрос")
+
+    def executemany(self, query, vars_list):
+        started = _time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            db_stats.record_query(_time.perf_counter() - started, self.rowcount)
+
+
+def _capture_plan(entry: dict, params: dict, statement: bytes):
+    """План снимается на своём соединении, чтобы не занимать соединение
+    вызывающего и не обрывать его транзакцию при ошибке EXPLAIN"""
+    try:
+        conn = psycopg2.connect(**params)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(b"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement)
+                plan = cur.fetchone()[0]
+            entry["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+        finally:
+            conn.rollback()
+            conn.close()
+    except Exception as e:
+        entry["plan_error"] = str(e)
+    finally:
+        _explaining.release()
+
+
+class InstrumentedCursor(InstrumentedCursorMixin, psycopg2.extensions.cursor):
+    pass
+
+
+class InstrumentedRealDictCursor(InstrumentedCursorMixin, RealDictCursor):
+    pass
+
+
+INSTRUMENTED_CURSORS = {
+    None: InstrumentedCursor,
+    psycopg2.extensions.cursor: InstrumentedCursor,
+    RealDictCursor: InstrumentedRealDictCursor,
+}
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """Соединение, курсоры которого пишут время и число строк в db_stats"""
+
+    # Параметры подключения для фонового EXPLAIN медленных запросов
+    explain_params: Optional[Dict] = None
+
+    def cursor(self, *args, cursor_factory=None, **kwargs):
+        # Без явного cursor_factory берётся фабрика соединения, как в psycopg2
+        requested = cursor_factory or self.cursor_factory
+        factory = INSTRUMENTED_CURSORS.get(requested, requested)
+        return super().cursor(*args, cursor_factory=factory, **kwargs)
+
+
 class DatabaseConnection:
     def __init__(self, dbname: str, user: str, password: str, host: str, port: str):
         self.conn_params = {
@@ -15,15 +252,19 @@ class DatabaseConnection:
         }
 
     def __enter__(self):
-        self.conn = psycopg2.connect(**self.conn_params)
+        started = _time.perf_counter()
+        self.conn = psycopg2.connect(**self.conn_params, connection_factory=InstrumentedConnection)
+        self.conn.explain_params = self.conn_params
+        db_stats.record_acquire(_time.perf_counter() - started)
         return self.conn
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.conn.close()
 
 class UserOperations:
-    def __init__(self, db_connection: DatabaseConnection):
+    def __init__(self, db_connection: DatabaseConnection, cache: EntityCache = entity_cache):
         self.db = db_connection
+        self.cache = cache
     def init(self):
         with self.db as conn:
             with conn.cursor() as cur:
@@ -49,28 +290,60 @@ CREATE TABLE Cabinets (
     description TEXT
 );
 
--- Create Pairs table
+-- Create Pairs table; period is the pair as a timestamp range
 CREATE TABLE Pairs (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     day DATE NOT NULL,
     start_time TIME NOT NULL,
     end_time TIME NOT NULL,
+    period TSRANGE GENERATED ALWAYS AS (tsrange(day + start_time, day + end_time)) STORED,
     CONSTRAINT check_time_order CHECK (start_time < end_time)
 );
 
 -- Create mapping table Pairs_Cabinets
+-- period is copied from Pairs so that one cabinet cannot hold two
+-- overlapping bookings (needs btree_gist for the cabinet_id WITH = part)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 CREATE TABLE Pairs_Cabinets (
     pair_id UUID NOT NULL REFERENCES Pairs(id) ON DELETE CASCADE,
     cabinet_id UUID NOT NULL REFERENCES Cabinets(id) ON DELETE CASCADE,
     user_id UUID NOT NULL REFERENCES Users(id) ON DELETE CASCADE,
     purpose TEXT,
-    PRIMARY KEY (pair_id, cabinet_id)
+    period TSRANGE NOT NULL,
+    PRIMARY KEY (pair_id, cabinet_id),
+    CONSTRAINT no_cabinet_double_booking EXCLUDE USING gist (cabinet_id WITH =, period WITH &&)
 );
 
+-- Keep Pairs_Cabinets.period in sync with Pairs
+CREATE FUNCTION pairs_cabinets_set_period() RETURNS trigger AS $$
+BEGIN
+    SELECT period INTO NEW.period FROM Pairs WHERE id = NEW.pair_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_pairs_cabinets_period
+    BEFORE INSERT OR UPDATE OF pair_id ON Pairs_Cabinets
+    FOR EACH ROW EXECUTE FUNCTION pairs_cabinets_set_period();
+
+CREATE FUNCTION pairs_sync_period() RETURNS trigger AS $$
+BEGIN
+    UPDATE Pairs_Cabinets SET period = NEW.period WHERE pair_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_pairs_period
+    AFTER UPDATE ON Pairs
+    FOR EACH ROW WHEN (OLD.period IS DISTINCT FROM NEW.period)
+    EXECUTE FUNCTION pairs_sync_period();
+
 -- Create indexes for better query performance
 CREATE INDEX idx_pairs_day ON Pairs(day);
 CREATE INDEX idx_cabinets_floor ON Cabinets(floor);
 CREATE INDEX idx_pairs_cabinets_user ON Pairs_Cabinets(user_id);
+CREATE INDEX idx_pairs_cabinets_period ON Pairs_Cabinets USING gist (period);
                     """)
                 conn.commit()
 
@@ -87,30 +360,50 @@ CREATE INDEX idx_pairs_cabinets_user ON Pairs_Cabinets(user_id);
                         password = EXCLUDED.password,
                         priority = EXCLUDED.priority,
                         "group" = EXCLUDED."group"
+                    RETURNING id
                     """, (id, name, username, password, priority, group))
+                user_id = cur.fetchone()[0]
                 conn.commit()
+        self.cache.invalidate(("user", str(user_id)), ("user", str(id)), ("username", username))
 
     def get_user_by_id(self, user_id: UUID) -> Dict:
+        user = self.cache.get(("user", str(user_id)))
+        if user is not None:
+            return user
         with self.db as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("SELECT * FROM Users WHERE id = %s", (user_id,))
-                return cur.fetchone()
+                user = cur.fetchone()
+        if user is not None:
+            self.cache.set(("user", str(user_id)), user)
+        return user
 
     def get_user_by_username(self, username: str) -> Dict:
+        user = self.cache.get(("username", username))
+        if user is not None:
+            return user
         with self.db as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("SELECT * FROM Users WHERE username = %s", (username,))
-                return cur.fetchone()
+                user = cur.fetchone()
+        if user is not None:
+            self.cache.set(("username", username), user)
+        return user
 
     def delete_user(self, user_id: UUID) -> None:
         with self.db as conn:
             with conn.cursor() as cur:
-                cur.execute("DELETE FROM Users WHERE id = %s", (user_id,))
+                cur.execute("DELETE FROM Users WHERE id = %s RETURNING username", (user_id,))
+                deleted = cur.fetchone()
                 conn.commit()
+        self.cache.invalidate(("user", str(user_id)))
+        if deleted:
+            self.cache.invalidate(("username", deleted[0]))
 
 class CabinetOperations:
-    def __init__(self, db_connection: DatabaseConnection):
+    def __init__(self, db_connection: DatabaseConnection, cache: EntityCache = entity_cache):
         self.db = db_connection
+        self.cache = cache
 
     def create_or_update_cabinet(self, id: UUID, number: int, floor: int,
                                type: str, description: str) -> None:
@@ -124,26 +417,45 @@ class CabinetOperations:
                         floor = EXCLUDED.floor,
                         type = EXCLUDED.type,
                         description = EXCLUDED.description
+                    RETURNING id
                     """, (id, number, floor, type, description))
+                cabinet_id = cur.fetchone()[0]
                 conn.commit()
+        self.cache.invalidate(("cabinet", str(cabinet_id)), ("cabinet", str(id)), ("cabinet_number", number))
 
     def get_cabinet_by_id(self, cabinet_id: UUID) -> Dict:
+        cabinet = self.cache.get(("cabinet", str(cabinet_id)))
+        if cabinet is not None:
+            return cabinet
         with self.db as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("SELECT * FROM Cabinets WHERE id = %s", (cabinet_id,))
-                return cur.fetchone()
+                cabinet = cur.fetchone()
+        if cabinet is not None:
+            self.cache.set(("cabinet", str(cabinet_id)), cabinet)
+        return cabinet
 
     def get_cabinet_by_number(self, number: int) -> Dict:
+        cabinet = self.cache.get(("cabinet_number", number))
+        if cabinet is not None:
+            return cabinet
         with self.db as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("SELECT * FROM Cabinets WHERE number = %s", (number,))
-                return cur.fetchone()
+                cabinet = cur.fetchone()
+        if cabinet is not None:
+            self.cache.set(("cabinet_number", number), cabinet)
+        return cabinet
 
     def delete_cabinet(self, cabinet_id: UUID) -> None:
         with self.db as conn:
             with conn.cursor() as cur:
-                cur.execute("DELETE FROM Cabinets WHERE id = %s", (cabinet_id,))
+                cur.execute("DELETE FROM Cabinets WHERE id = %s RETURNING number", (cabinet_id,))
+                deleted = cur.fetchone()
                 conn.commit()
+        self.cache.invalidate(("cabinet", str(cabinet_id)))
+        if deleted:
+            self.cache.invalidate(("cabinet_number", deleted[0]))
 
 class PairOperations:
     def __init__(self, db_connection: DatabaseConnection):
@@ -188,36 +500,47 @@ class PairsCabinetsOperations:
 
     def create_or_update_pairs_cabinets(self, pair_id: UUID, cabinet_id: UUID,
                                       user_id: UUID, purpose: str) -> bool:
+        """Бронь кабинета на пару. Пересекающиеся по времени брони этого
+        кабинета с приоритетом ниже снимаются в той же транзакции; если
+        остаётся бронь с приоритетом не ниже, возвращает False"""
         with self.db as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    WITH new_mapping AS (
-                        SELECT
-                            %s as pair_id,
-                            %s as cabinet_id,
-                            %s as user_id,
-                            %s as purpose,
-                            (SELECT priority FROM Users WHERE id = %s) as new_priority
-                    )
-                    INSERT INTO Pairs_Cabinets (pair_id, cabinet_id, user_id, purpose)
-                    SELECT
-                        pair_id, cabinet_id, user_id, purpose
-                    FROM
-                        new_mapping
-                    ON CONFLICT (pair_id, cabinet_id)
-                    DO UPDATE SET
-                        user_id = EXCLUDED.user_id,
-                        purpose = EXCLUDED.purpose
-                    WHERE (
-                        SELECT priority FROM Users WHERE id = EXCLUDED.user_id
-                    ) > (
-                        SELECT priority FROM Users WHERE id = Pairs_Cabinets.user_id
-                    )
-                    RETURNING id
-                    """, (pair_id, cabinet_id, user_id, purpose, user_id))
-                result = cur.fetchone()
+                try:
+                    cur.execute("""
+                        DELETE FROM Pairs_Cabinets pc
+                        USING Users u
+                        WHERE u.id = pc.user_id
+                        AND pc.cabinet_id = %s
+                        AND pc.pair_id <> %s
+                        AND pc.period && (SELECT period FROM Pairs WHERE id = %s)
+                        AND u.priority < (SELECT priority FROM Users WHERE id = %s)
+                        """, (cabinet_id, pair_id, pair_id, user_id))
+                    cur.execute("""
+                        INSERT INTO Pairs_Cabinets (pair_id, cabinet_id, user_id, purpose)
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (pair_id, cabinet_id)
+                        DO UPDATE SET
+                            user_id = EXCLUDED.user_id,
+                            purpose = EXCLUDED.purpose
+                        WHERE (
+                            SELECT priority FROM Users WHERE id = EXCLUDED.user_id
+                        ) > (
+                            SELECT priority FROM Users WHERE id = Pairs_Cabinets.user_id
+                        )
+                        RETURNING pair_id
+                        """, (pair_id, cabinet_id, user_id, purpose))
+                    result = cur.fetchone()
+                except psycopg2.errors.ExclusionViolation:
+                    # Кабинет в это время занят бронью с приоритетом не ниже
+                    conn.rollback()
+                    return False
+                if result is None:
+                    # Та же пара уже занята бронью с приоритетом не ниже:
+                    # снятые выше брони возвращаются
+                    conn.rollback()
+                    return False
                 conn.commit()
-                return result is not None
+                return True
 
     def get_pairs_cabinets_info(self, pair_id: UUID) -> List[Dict]:
         with self.db as conn:
@@ -258,11 +581,14 @@ class CabinetScheduleOperations:
         with self.db as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
-                    WITH RECURSIVE time_slots AS (
-                        SELECT
-                            %s::date as check_date,
-                            %s::time as start_time,
-                            %s::time as end_time
+                    WITH time_slots AS (
+                        SELECT tsrange(check_date + start_time, check_date + end_time) as period
+                        FROM (
+                            SELECT
+                                %s::date as check_date,
+                                %s::time as start_time,
+                                %s::time as end_time
+                        ) AS args
                     )
                     SELECT DISTINCT
                         c.id as cabinet_id,
@@ -282,9 +608,7 @@ class CabinetScheduleOperations:
                         INNER JOIN Users u ON u.id = pc.user_id,
                         time_slots ts
                     WHERE
-                        p.day = ts.check_date
-                        AND p.start_time <= ts.start_time
-                        AND p.end_time >= ts.end_time
+                        pc.period @> ts.period
                     ORDER BY
                         c.floor,
                         c.number,
@@ -297,11 +621,14 @@ class CabinetScheduleOperations:
         with self.db as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
-                    WITH RECURSIVE time_slots AS (
-                        SELECT
-                            %s::date as check_date,
-                            %s::time as start_time,
-                            %s::time as end_time
+                    WITH time_slots AS (
+                        SELECT tsrange(check_date + start_time, check_date + end_time) as period
+                        FROM (
+                            SELECT
+                                %s::date as check_date,
+                                %s::time as start_time,
+                                %s::time as end_time
+                        ) AS args
                     )
                     SELECT DISTINCT
                         c.id as cabinet_id,
@@ -314,14 +641,8 @@ class CabinetScheduleOperations:
                         u.name as reserved_by,
                         u.priority as user_priority,
                         pc.purpose,
-                        CASE
-                            WHEN p.start_time <= ts.start_time THEN ts.start_time
-                            ELSE p.start_time
-                        END as overlap_start,
-                        CASE
-                            WHEN p.end_time >= ts.end_time THEN ts.end_time
-                            ELSE p.end_time
-                        END as overlap_end
+                        lower(pc.period * ts.period)::time as overlap_start,
+                        upper(pc.period * ts.period)::time as overlap_end
                     FROM
                         Cabinets c
                         INNER JOIN Pairs_Cabinets pc ON c.id = pc.cabinet_id
@@ -329,12 +650,8 @@ class CabinetScheduleOperations:
                         INNER JOIN Users u ON u.id = pc.user_id,
                         time_slots ts
                     WHERE
-                        p.day = ts.check_date
-                        AND (
-                            (p.start_time < ts.end_time AND p.start_time >= ts.start_time)
-                            OR (p.end_time > ts.start_time AND p.end_time <= ts.end_time)
-                        )
-                        AND NOT (p.start_time <= ts.start_time AND p.end_time >= ts.end_time)
+                        pc.period && ts.period
+                        AND NOT pc.period @> ts.period
                     ORDER BY
                         c.floor,
                         c.number,
@@ -347,11 +664,14 @@ class CabinetScheduleOperations:
         with self.db as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
-                    WITH RECURSIVE time_slots AS (
-                        SELECT
-                            %s::date as check_date,
-                            %s::time as start_time,
-                            %s::time as end_time
+                    WITH time_slots AS (
+                        SELECT tsrange(check_date + start_time, check_date + end_time) as period
+                        FROM (
+                            SELECT
+                                %s::date as check_date,
+                                %s::time as start_time,
+                                %s::time as end_time
+                        ) AS args
                     )
                     SELECT
                         c.id as cabinet_id,
@@ -360,21 +680,15 @@ class CabinetScheduleOperations:
                         c.type,
                         c.description
                     FROM
-                        Cabinets c
+                        Cabinets c,
+                        time_slots ts
                     WHERE
                         NOT EXISTS (
                             SELECT 1
                             FROM Pairs_Cabinets pc
-                            JOIN Pairs p ON p.id = pc.pair_id,
-                            time_slots ts
                             WHERE
                                 pc.cabinet_id = c.id
-                                AND p.day = ts.check_date
-                                AND (
-                                    (p.start_time <= ts.start_time AND p.end_time > ts.start_time)
-                                    OR (p.start_time < ts.end_time AND p.end_time >= ts.end_time)
-                                    OR (p.start_time >= ts.start_time AND p.end_time <= ts.end_time)
-                                )
+                                AND pc.period && ts.period
                         )
                     ORDER BY
                         c.floor,
@@ -425,12 +739,13 @@ ORDER BY
 """, (cabinet_id, check_date))
                 return cur.fetchall()
 
-con = DatabaseConnection("fast_api","postgres","postgres","localhost", "5433")
+if __name__ == "__main__":
+    con = DatabaseConnection("fast_api","postgres","postgres","localhost", "5433")
 
-user_operations =UserOperations(con)
-pairs = PairOperations(con)
+    user_operations =UserOperations(con)
+    pairs = PairOperations(con)
 
-print(pairs.create_or_update_pair("a4b34841-0f60-4d14-a0af-ee7190f39d46","2025-01-01","10:10:10","11:11:11"))
-print(pairs.get_pairs_by_day("2025-01-01"))
-print(pairs.get_pair_by_id("a4b34841-0f60-4d14-a0af-ee7190f39d46"))
-print(pairs.delete_pair("a4b34841-0f60-4d14-a0af-ee7190f39d46"))
+    print(pairs.create_or_update_pair("a4b34841-0f60-4d14-a0af-ee7190f39d46","2025-01-01","10:10:10","11:11:11"))
+    print(pairs.get_pairs_by_day("2025-01-01"))
+    print(pairs.get_pair_by_id("a4b34841-0f60-4d14-a0af-ee7190f39d46"))
+    print(pairs.delete_pair("a4b34841-0f60-4d14-a0af-ee7190f39d46"))
@@ -97,11 +97,14 @@ WHERE pair_id = $1 AND cabinet_id = $2;
 
 
 -- Function to get cabinets that are busy for the entire period
-WITH RECURSIVE time_slots AS (
-    SELECT
-        $1::date as check_date,
-        $2::time as start_time,
-        $3::time as end_time
+WITH time_slots AS (
+    SELECT tsrange(check_date + start_time, check_date + end_time) as period
+    FROM (
+        SELECT
+            $1::date as check_date,
+            $2::time as start_time,
+            $3::time as end_time
+    ) AS args
 )
 SELECT DISTINCT
     c.id as cabinet_id,
@@ -121,20 +124,21 @@ FROM
     INNER JOIN Users u ON u.id = pc.user_id,
     time_slots ts
 WHERE
-    p.day = ts.check_date
-    AND p.start_time <= ts.start_time
-    AND p.end_time >= ts.end_time
+    pc.period @> ts.period
 ORDER BY
     c.floor,
     c.number,
     p.start_time;
 
 -- Function to get cabinets that are partially busy during the period
-WITH RECURSIVE time_slots AS (
-    SELECT
-        $1::date as check_date,
-        $2::time as start_time,
-        $3::time as end_time
+WITH time_slots AS (
+    SELECT tsrange(check_date + start_time, check_date + end_time) as period
+    FROM (
+        SELECT
+            $1::date as check_date,
+            $2::time as start_time,
+            $3::time as end_time
+    ) AS args
 )
 SELECT DISTINCT
     c.id as cabinet_id,
@@ -147,14 +151,8 @@ SELECT DISTINCT
     u.name as reserved_by,
     u.priority as user_priority,
     pc.purpose,
-    CASE
-        WHEN p.start_time <= ts.start_time THEN ts.start_time
-        ELSE p.start_time
-    END as overlap_start,
-    CASE
-        WHEN p.end_time >= ts.end_time THEN ts.end_time
-        ELSE p.end_time
-    END as overlap_end
+    lower(pc.period * ts.period)::time as overlap_start,
+    upper(pc.period * ts.period)::time as overlap_end
 FROM
     Cabinets c
     INNER JOIN Pairs_Cabinets pc ON c.id = pc.cabinet_id
@@ -162,12 +160,8 @@ FROM
     INNER JOIN Users u ON u.id = pc.user_id,
     time_slots ts
 WHERE
-    p.day = ts.check_date
-    AND (
-        (p.start_time < ts.end_time AND p.start_time >= ts.start_time)
-        OR (p.end_time > ts.start_time AND p.end_time <= ts.end_time)
-    )
-    AND NOT (p.start_time <= ts.start_time AND p.end_time >= ts.end_time)
+    pc.period && ts.period
+    AND NOT pc.period @> ts.period
 ORDER BY
     c.floor,
     c.number,
@@ -180,11 +174,14 @@ ORDER BY
 -- SELECT * FROM get_partially_busy_cabinets('2024-02-20', '09:00', '10:30');
 
 -- Function to get completely free cabinets for the period
-WITH RECURSIVE time_slots AS (
-    SELECT
-        $1::date as check_date,
-        $2::time as start_time,
-        $3::time as end_time
+WITH time_slots AS (
+    SELECT tsrange(check_date + start_time, check_date + end_time) as period
+    FROM (
+        SELECT
+            $1::date as check_date,
+            $2::time as start_time,
+            $3::time as end_time
+    ) AS args
 )
 SELECT
     c.id as cabinet_id,
@@ -193,21 +190,15 @@ SELECT
     c.type,
     c.description
 FROM
-    Cabinets c
+    Cabinets c,
+    time_slots ts
 WHERE
     NOT EXISTS (
         SELECT 1
         FROM Pairs_Cabinets pc
-        JOIN Pairs p ON p.id = pc.pair_id,
-        time_slots ts
         WHERE
             pc.cabinet_id = c.id
-            AND p.day = ts.check_date
-            AND (
-                (p.start_time <= ts.start_time AND p.end_time > ts.start_time)
-                OR (p.start_time < ts.end_time AND p.end_time >= ts.end_time)
-                OR (p.start_time >= ts.start_time AND p.end_time <= ts.end_time)
-            )
+            AND pc.period && ts.period
     )
 ORDER BY
     c.floor,
@@ -20,25 +20,57 @@ CREATE TABLE Cabinets (
     description TEXT
 );
 
--- Create Pairs table
+-- Create Pairs table; period is the pair as a timestamp range
 CREATE TABLE Pairs (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     day DATE NOT NULL,
     start_time TIME NOT NULL,
     end_time TIME NOT NULL,
+    period TSRANGE GENERATED ALWAYS AS (tsrange(day + start_time, day + end_time)) STORED,
     CONSTRAINT check_time_order CHECK (start_time < end_time)
 );
 
 -- Create mapping table Pairs_Cabinets
+-- period is copied from Pairs so that one cabinet cannot hold two
+-- overlapping bookings (needs btree_gist for the cabinet_id WITH = part)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 CREATE TABLE Pairs_Cabinets (
     pair_id UUID NOT NULL REFERENCES Pairs(id) ON DELETE CASCADE,
     cabinet_id UUID NOT NULL REFERENCES Cabinets(id) ON DELETE CASCADE,
     user_id UUID NOT NULL REFERENCES Users(id) ON DELETE CASCADE,
     purpose TEXT,
-    PRIMARY KEY (pair_id, cabinet_id)
+    period TSRANGE NOT NULL,
+    PRIMARY KEY (pair_id, cabinet_id),
+    CONSTRAINT no_cabinet_double_booking EXCLUDE USING gist (cabinet_id WITH =, period WITH &&)
 );
 
+-- Keep Pairs_Cabinets.period in sync with Pairs
+CREATE FUNCTION pairs_cabinets_set_period() RETURNS trigger AS $$
+BEGIN
+    SELECT period INTO NEW.period FROM Pairs WHERE id = NEW.pair_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_pairs_cabinets_period
+    BEFORE INSERT OR UPDATE OF pair_id ON Pairs_Cabinets
+    FOR EACH ROW EXECUTE FUNCTION pairs_cabinets_set_period();
+
+CREATE FUNCTION pairs_sync_period() RETURNS trigger AS $$
+BEGIN
+    UPDATE Pairs_Cabinets SET period = NEW.period WHERE pair_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_pairs_period
+    AFTER UPDATE ON Pairs
+    FOR EACH ROW WHEN (OLD.period IS DISTINCT FROM NEW.period)
+    EXECUTE FUNCTION pairs_sync_period();
+
 -- Create indexes for better query performance
 CREATE INDEX idx_pairs_day ON Pairs(day);
 CREATE INDEX idx_cabinets_floor ON Cabinets(floor);
-CREATE INDEX idx_pairs_cabinets_user ON Pairs_Cabinets(user_id);
\ No newline at end of file
+CREATE INDEX idx_pairs_cabinets_user ON Pairs_Cabinets(user_id);
+CREATE INDEX idx_pairs_cabinets_period ON Pairs_Cabinets USING gist (period);
\ No newline at end of file
@@ -97,3 +97,20 @@ export async function getBeacon(): Promise<Beacon[]> {
     throw error;
   }
 }
+
+export interface RouteResult {
+  vertices: string[];
+  length: number;
+  path: string;
+}
+
+// Маршрут, посчитанный на сервере; null — сервер недоступен или пути нет
+export async function getRoute(from: string, to: string): Promise<RouteResult | null> {
+  try {
+    const response = await apiService.get("/route", { params: { from, to } });
+    return response.data as RouteResult;
+  } catch (error) {
+    console.error("Error fetching route from API, falling back to local graph:", error);
+    return null;
+  }
+}
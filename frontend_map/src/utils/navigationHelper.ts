@@ -3,13 +3,28 @@ import { graph } from "../algorithms/dijkstra";
 import { Navigation, NavigationContextType } from "./types";
 import { ObjectItem } from "./types";
 import { graphData } from "@/store/graphData";
+import { getRoute } from "@/services/mapServices";
 import { toast } from "react-toastify";
 export let routeLength = 0;
 
 const findVertexByObjectId = (vertexId: string) =>
   graphData.vertices.find((v) => v.objectName === vertexId);
 
-export function navigateToObject(
+function localRoutePath(start: string, targetId: string) {
+  const shortestPath = graph.calculateShortestPath(start, targetId);
+  const pathString = shortestPath
+    .slice(1)
+    .map((vertexId) => {
+      const vertex = graphData.vertices.find((v) => v.id === vertexId);
+      return vertex ? `L${vertex.cx} ${vertex.cy}` : "";
+    })
+    .join(" ");
+
+  const startVertex = graphData.vertices.find((v) => v.id === start);
+  return startVertex ? `M${startVertex.cx} ${startVertex.cy} ${pathString}` : null;
+}
+
+export async function navigateToObject(
   selectedObjectId: string,
   navigation: NavigationContextType["navigation"],
   setNavigation: NavigationContextType["setNavigation"]
@@ -21,22 +36,12 @@ export function navigateToObject(
     return;
   }
 
-  const shortestPath = graph.calculateShortestPath(navigation.start, target.id);
-  const pathString = shortestPath
-    .slice(1)
-    .map((vertexId) => {
-      const vertex = graphData.vertices.find((v) => v.id === vertexId);
-      return vertex ? `L${vertex.cx} ${vertex.cy}` : "";
-    })
-    .join(" ");
-
-  const startVertex = graphData.vertices.find((v) => v.id === navigation.start);
+  // Сервер отдаёт готовый путь; без него маршрут считается локально
+  const route = await getRoute(navigation.start, target.id);
+  const routePath = route ? route.path : localRoutePath(navigation.start, target.id);
   const navigationRoutePath = document.getElementById("navigation-route");
-  if (navigationRoutePath && startVertex) {
-    navigationRoutePath.setAttribute(
-      "d",
-      `M${startVertex.cx} ${startVertex.cy} ${pathString}`
-    );
+  if (navigationRoutePath && routePath) {
+    navigationRoutePath.setAttribute("d", routePath);
     console.log("navigationRoutePath", navigationRoutePath);
     navigationRoutePath.classList.remove("path-once", "path-active");
     navigationRoutePath.classList.add("path-once");
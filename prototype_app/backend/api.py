@@ -1,14 +1,102 @@
-from datetime import timedelta, datetime
-from typing import Optional
-
-from fastapi import FastAPI, HTTPException
+import asyncio
+import base64
+import time
+from contextlib import asynccontextmanager
+from datetime import timedelta, datetime, date as date_type
+from typing import List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import  psycopg2
-from psycopg2.extras import RealDictCursor
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, ProgrammingError, TimeoutError as PoolTimeout
 from uuid import UUID
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+from auth import TokenUser, create_token, current_user
+from config import settings
+from entity_cache import EntityCache
+from etags import not_modified, versions
+from fast_json import CABINET_FIELDS, SCHEDULE_FIELDS, dumps, json_response, rows_to_dicts
+from database import (RequestStats, engine, get_session, pool_counters,
+                      pool_stats as get_pool_stats, request_stats, warm_pool)
+from live_updates import broadcaster, event_date
+import metrics
+from occupancy import PAIR_TIMES, SLOT_BY_TIMES, occupancy
+from partitions import ensure_partitions, forget_partitions, semester_of
+from routing import load_routing_table
+from slot_search import busy_matrix, find_free_runs
+from slow_queries import slow_log
+from timetable_import import import_timetable, read_rows
+from utilization import CUBE_SQL, build_cube, report as utilization_report
+
+entity_cache = EntityCache(settings.ENTITY_CACHE_SIZE, settings.ENTITY_CACHE_TTL)
+
+# Каталог кабинетов, уже сериализованный в JSON, и его ETag
+catalog_cache = {"etag": None, "body": b""}
+
+# Граф карты с предрассчитанными маршрутами и готовые ответы /route
+routing = {"table": None}
+route_cache = EntityCache(settings.ROUTE_CACHE_SIZE, None)
+
+# Отчёты о загрузке: (start, end) -> (ETag, JSON); устаревают вместе с ETag
+utilization_cache = EntityCache(settings.UTILIZATION_CACHE_SIZE, None)
+
+
+async def warm_occupancy():
+    async with get_session() as session:
+        await occupancy.warm_around(
+            session, date_type.today(),
+            settings.OCCUPANCY_DAYS_BACK, settings.OCCUPANCY_DAYS_AHEAD
+        )
+
+
+def apply_booking_event(event: dict):
+    """Событие из канала bookings обновляет индекс занятости и версии ETag"""
+    day, cabinet_id = event_date(event), UUID(event["cabinet_id"])
+    if event["state"] == "busy":
+        occupancy.mark_busy(day, cabinet_id, event["slot"])
+    else:
+        occupancy.mark_free(day, cabinet_id, event["slot"])
+    versions.bump_booking(cabinet_id, day)
+
+
+async def resync_after_reconnect():
+    """Пока слушатель bookings был отключён, события терялись"""
+    versions.reset()
+    await warm_occupancy()
+
+
+broadcaster.handlers.append(apply_booking_event)
+broadcaster.resync_hooks.append(resync_after_reconnect)
+
+
+async def ensure_partitions_for(start: date_type, end: date_type):
+    async with engine.begin() as conn:
+        await ensure_partitions(lambda sql: conn.execute(text(sql)), start, end)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_pool()
+    today = date_type.today()
+    try:
+        # Секции на текущий и следующий семестры создаются заранее
+        await ensure_partitions_for(today, today + timedelta(days=settings.OCCUPANCY_DAYS_AHEAD + 184))
+    except ProgrammingError:
+        pass  # /init/ ещё не вызывался
+    await warm_occupancy()
+    routing["table"] = load_routing_table(settings.GRAPH_DATA_FILE)
+    route_cache.clear()
+    broadcaster.start()
+    try:
+        yield
+    finally:
+        await broadcaster.stop()
+        await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
@@ -17,31 +105,189 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Курсор следующей страницы истории и ETag для повторной проверки
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
-# Подключение к базе данных
-def get_db_connection():
-    conn = psycopg2.connect(
-        dbname="fast_api",
-        user="postgres",
-        password="postgres",
-        host="localhost",
-        port = "5432",
-        cursor_factory=RealDictCursor
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """Метрики запроса для /metrics; X-DB-Queries — сколько SQL ушло в базу.
+
+    Шаблон пути берётся из scope["route"], который заполняет роутер, а не
+    перебором маршрутов: до вызова обработчика он ещё не известен, поэтому
+    запросы в обработке считаются только по методу."""
+    stats = RequestStats(request.scope)
+    token = request_stats.set(stats)
+    metrics.http_in_flight.inc((request.method,))
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = stats.route or "unmatched"
+        labels = (request.method, route)
+        metrics.http_in_flight.dec((request.method,))
+        metrics.http_latency.observe(labels, time.perf_counter() - started)
+        metrics.http_requests.inc((request.method, route, str(status)))
+        request_stats.reset(token)
+        route_labels = (route,)
+        metrics.db_queries.inc(route_labels, stats.queries)
+        metrics.db_rows.inc(route_labels, stats.rows)
+        metrics.db_queries_per_request.observe(route_labels, stats.queries)
+        for duration in stats.query_durations:
+            metrics.db_query_latency.observe(route_labels, duration)
+        for duration in stats.acquire_durations:
+            metrics.db_acquire_latency.observe(route_labels, duration)
+    response.headers["X-DB-Queries"] = str(stats.queries)
+    return response
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    pool_counters["timeouts_total"] += 1
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "База данных перегружена, повторите запрос позже"},
+        headers={"Retry-After": "1"}
     )
-    return conn
+
+
+@app.get("/pool/stats")
+async def pool_stats():
+    return get_pool_stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return entity_cache.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Метрики в формате Prometheus (text exposition 0.0.4)"""
+    pool = get_pool_stats()
+    lines = [metrics.registry.render()]
+    for key in ("open", "idle", "in_use", "overflow"):
+        lines.append(f"db_pool_{key} {pool[key]}\n")
+    for key, value in pool_counters.items():
+        lines.append(f"db_pool_{key} {value}\n")
+    return PlainTextResponse("".join(lines), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/slow_queries")
+async def slow_queries():
+    """Последние медленные запросы с планами, если они сняты"""
+    return slow_log.stats()
+
+
+@app.get("/events/stats")
+async def events_stats():
+    return broadcaster.stats()
+
+
+@app.get("/route")
+async def get_route(request: Request, start: str = Query(alias="from"), finish: str = Query(alias="to")):
+    """Кратчайший маршрут по карте между вершинами (id или имя объекта):
+    список вершин, длина и готовый SVG-путь для отрисовки"""
+    table = routing["table"]
+    if table is None:
+        raise HTTPException(status_code=503, detail="Граф карты не загружен")
+    source, target = table.resolve(start), table.resolve(finish)
+    if source is None or target is None:
+        raise HTTPException(status_code=404, detail="Точка на карте не найдена")
+
+    etag = f'"route.{table.version}.{source}.{target}"'
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    body = route_cache.get((source, target))
+    if body is None:
+        route = table.route(source, target)
+        if route is None:
+            raise HTTPException(status_code=404, detail="Маршрут между точками не найден")
+        body = dumps(route._asdict())
+        route_cache.set((source, target), body)
+    return json_response(body, etag)
+
+
+@app.get("/route/stats")
+async def route_stats():
+    table = routing["table"]
+    return {"graph": table.stats() if table else None, "cache": route_cache.stats()}
+
+
+# Самый длинный период, который отдаёт /cabinets/availability
+MAX_GRID_DAYS = 62
+# Сколько комнат максимум отдаёт /cabinets/nearest_free
+MAX_NEAREST_ROOMS = 50
+# Самый длинный период отчёта /analytics/utilization
+MAX_UTILIZATION_DAYS = 366
+# Сколько кабинетов можно запросить в /schedule/ за раз
+MAX_BATCH_CABINETS = 200
+# Раз в сколько секунд молчащий поток событий шлёт комментарий-пинг
+SSE_HEARTBEAT = 15.0
+# Страница истории кабинета (GET /cabinets/{id}/schedule без date)
+SCHEDULE_PAGE_SIZE = 200
+MAX_SCHEDULE_PAGE_SIZE = 1000
+# Сколько строк за раз читается из серверного курсора в режиме ndjson
+STREAM_BATCH_SIZE = 500
+
+CABINET_COLUMNS = "id, number, floor, type, description"
+
+# Колонки расписания в порядке SCHEDULE_FIELDS; даты и время форматируются сразу в SQL
+SCHEDULE_COLUMNS = """
+    p.id as pair_id,
+    to_char(p.date, 'YYYY-MM-DD') as date,
+    to_char(p.start_time, 'HH24:MI') as start_time,
+    to_char(p.end_time, 'HH24:MI') as end_time,
+    u.name as user_name,
+    u.priority as user_role,
+    u."group" as user_group,
+    pc.purpose
+"""
 
 
 # Функции для работы с датами
 def get_week_range(date_str: str) -> tuple:
     """Получает начальную и конечную дату недели"""
-    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+    date_obj = datetime.combine(parse_date(date_str), datetime.min.time())
     monday = date_obj - timedelta(days=date_obj.weekday())
     sunday = monday + timedelta(days=6)
     return monday, sunday
 
 
+def parse_date(date_str: str):
+    """asyncpg принимает только объекты date/time, а не строки.
+    Некорректная дата от клиента — 400, а не 500."""
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Некорректная дата: {date_str}")
+
+
+def parse_time(time_str: str):
+    try:
+        return datetime.strptime(time_str[:5], '%H:%M').time()
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Некорректное время: {time_str}")
+
+
+def encode_cursor(date_str: str, time_str: str) -> str:
+    """Курсор страницы истории — позиция последней отданной брони"""
+    return base64.urlsafe_b64encode(f"{date_str}|{time_str}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date_str, time_str = raw.split("|")
+        return parse_date(date_str), parse_time(time_str)
+    except (ValueError, HTTPException):
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+
+
 # Модели Pydantic для валидации данных
 class User(BaseModel):
     name: str
@@ -67,7 +313,8 @@ class PairCreate(BaseModel):
 class PairCabinet(BaseModel):
     pair_id: UUID
     cabinet_id: UUID
-    user_id: UUID
+    # Пользователь берётся из токена; поле оставлено для старых клиентов
+    user_id: Optional[UUID] = None
     purpose: str
 
 
@@ -78,10 +325,11 @@ class LoginRequest(BaseModel):
 
 # Инициализация базы данных
 @app.post("/init/")
-def init():
-    conn = get_db_connection()
-    with conn.cursor() as cursor:
-        cursor.execute("""
+async def init():
+    async with engine.begin() as conn:
+        # Скрипт из нескольких команд asyncpg выполняет только без параметров
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.execute("""
         -- Create enum type for user priority
         CREATE TYPE user_priority AS ENUM ('prostoi-smertni', 'union', 'prepod', 'dispetcher');
 
@@ -104,48 +352,161 @@ def init():
             description TEXT
         );
 
-        -- Create Pairs table with dates
+        -- Create Pairs table: one row per (date, slot), slot is the pair number.
+        -- Partitioned by semester (partitions.py), so keys include date
         CREATE TABLE Pairs (
-            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
             date DATE NOT NULL,
+            slot SMALLINT NOT NULL,
             start_time TIME NOT NULL,
             end_time TIME NOT NULL,
-            CONSTRAINT check_time_order CHECK (start_time < end_time)
-        );
-
-        -- Create mapping table Pairs_Cabinets
+            PRIMARY KEY (id, date),
+            CONSTRAINT check_time_order CHECK (start_time < end_time),
+            CONSTRAINT check_slot CHECK (slot BETWEEN 1 AND 8),
+            CONSTRAINT uq_pairs_date_slot UNIQUE (date, slot)
+        ) PARTITION BY RANGE (date);
+
+        -- Create mapping table Pairs_Cabinets, partitioned like Pairs;
+        -- date duplicates Pairs.date for the foreign key and pruning
         CREATE TABLE Pairs_Cabinets (
-            pair_id UUID NOT NULL REFERENCES Pairs(id) ON DELETE CASCADE,
+            pair_id UUID NOT NULL,
+            date DATE NOT NULL,
             cabinet_id UUID NOT NULL REFERENCES Cabinets(id) ON DELETE CASCADE,
             user_id UUID NOT NULL REFERENCES Users(id) ON DELETE CASCADE,
             purpose TEXT,
-            PRIMARY KEY (pair_id, cabinet_id)
-        );
+            -- Set only by the ON CONFLICT DO UPDATE branch of a booking:
+            -- this row took the slot over from a lower-priority booking
+            preempted BOOLEAN NOT NULL DEFAULT false,
+            PRIMARY KEY (pair_id, cabinet_id, date),
+            FOREIGN KEY (pair_id, date) REFERENCES Pairs(id, date) ON DELETE CASCADE
+        ) PARTITION BY RANGE (date);
+
+        CREATE TABLE Pairs_default PARTITION OF Pairs DEFAULT;
+        CREATE TABLE Pairs_Cabinets_default PARTITION OF Pairs_Cabinets DEFAULT;
 
         -- Create indexes
-        CREATE INDEX idx_pairs_date ON Pairs(date);
         CREATE INDEX idx_cabinets_floor ON Cabinets(floor);
         CREATE INDEX idx_pairs_cabinets_user ON Pairs_Cabinets(user_id);
+        CREATE INDEX idx_pairs_cabinets_cabinet ON Pairs_Cabinets(cabinet_id, date);
+
+        -- Notify listeners (live_updates.py) about every booking change
+        CREATE FUNCTION notify_booking_change() RETURNS trigger AS $$
+        DECLARE
+            rec RECORD;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                rec := OLD;
+            ELSE
+                rec := NEW;
+            END IF;
+            PERFORM pg_notify('bookings', json_build_object(
+                'cabinet_id', rec.cabinet_id,
+                'floor', c.floor,
+                'date', rec.date,
+                'slot', p.slot,
+                'state', CASE WHEN TG_OP = 'DELETE' THEN 'free' ELSE 'busy' END,
+                'user_id', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE rec.user_id END
+            )::text)
+            FROM Pairs p, Cabinets c
+            WHERE p.id = rec.pair_id AND p.date = rec.date AND c.id = rec.cabinet_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_pairs_cabinets_notify
+        AFTER INSERT OR UPDATE OR DELETE ON Pairs_Cabinets
+        FOR EACH ROW EXECUTE FUNCTION notify_booking_change();
+
+        -- Daily occupancy summary (occupancy_summary.py): one row per busy
+        -- cabinet-day, kept current by the triggers below
+        CREATE TABLE Cabinet_Day_Occupancy (
+            date DATE NOT NULL,
+            cabinet_id UUID NOT NULL REFERENCES Cabinets(id) ON DELETE CASCADE,
+            mask SMALLINT NOT NULL,
+            booked SMALLINT NOT NULL,
+            PRIMARY KEY (date, cabinet_id)
+        );
+
+        CREATE FUNCTION maintain_cabinet_day_occupancy() RETURNS trigger AS $$
+        DECLARE
+            slot_bit SMALLINT;
+        BEGIN
+            -- Preemption only changes the owner, occupancy stays the same
+            IF TG_OP = 'UPDATE' AND NEW.pair_id = OLD.pair_id
+                AND NEW.cabinet_id = OLD.cabinet_id AND NEW.date = OLD.date THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                SELECT 1 << (slot - 1) INTO slot_bit
+                FROM Pairs WHERE id = OLD.pair_id AND date = OLD.date;
+                -- Not found: the pair itself is being deleted and
+                -- release_pair_occupancy() has already subtracted it
+                IF FOUND THEN
+                    UPDATE Cabinet_Day_Occupancy
+                    SET mask = mask & ~slot_bit, booked = booked - 1
+                    WHERE date = OLD.date AND cabinet_id = OLD.cabinet_id;
+                    DELETE FROM Cabinet_Day_Occupancy
+                    WHERE date = OLD.date AND cabinet_id = OLD.cabinet_id AND booked <= 0;
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT 1 << (slot - 1) INTO slot_bit
+                FROM Pairs WHERE id = NEW.pair_id AND date = NEW.date;
+                INSERT INTO Cabinet_Day_Occupancy (date, cabinet_id, mask, booked)
+                VALUES (NEW.date, NEW.cabinet_id, slot_bit, 1)
+                ON CONFLICT (date, cabinet_id) DO UPDATE
+                SET mask = Cabinet_Day_Occupancy.mask | EXCLUDED.mask,
+                    booked = Cabinet_Day_Occupancy.booked + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_pairs_cabinets_occupancy
+        AFTER INSERT OR UPDATE OR DELETE ON Pairs_Cabinets
+        FOR EACH ROW EXECUTE FUNCTION maintain_cabinet_day_occupancy();
+
+        -- Cascaded booking deletes no longer see their pair, so the pair
+        -- releases its bookings from the summary before it goes away
+        CREATE FUNCTION release_pair_occupancy() RETURNS trigger AS $$
+        BEGIN
+            UPDATE Cabinet_Day_Occupancy o
+            SET mask = o.mask & ~(1 << (OLD.slot - 1)), booked = o.booked - 1
+            FROM Pairs_Cabinets pc
+            WHERE pc.pair_id = OLD.id AND pc.date = OLD.date
+            AND o.date = OLD.date AND o.cabinet_id = pc.cabinet_id;
+            DELETE FROM Cabinet_Day_Occupancy WHERE date = OLD.date AND booked <= 0;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_pairs_release_occupancy
+        BEFORE DELETE ON Pairs
+        FOR EACH ROW EXECUTE FUNCTION release_pair_occupancy();
         """)
-        conn.commit()
+        forget_partitions()
+        today = date_type.today()
+        await ensure_partitions(raw.driver_connection.execute,
+                                today - timedelta(days=365), today + timedelta(days=365))
+    entity_cache.clear()
+    versions.reset()
+    await warm_occupancy()
 
 
 # Авторизация
 @app.post("/users/login")
 async def login(login_data: LoginRequest):
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
+    async with get_session() as session:
         # Проверяем учетные данные
-        cur.execute(
-            """
+        result = await session.execute(
+            text("""
             SELECT id, name, username, priority, "group"
             FROM Users 
-            WHERE username = %s AND password = %s
-            """,
-            (login_data.username, login_data.password)
+            WHERE username = :username AND password = :password
+            """),
+            {"username": login_data.username, "password": login_data.password}
         )
-        user = cur.fetchone()
+        user = result.mappings().one_or_none()
 
         if user is None:
             raise HTTPException(
@@ -153,317 +514,670 @@ async def login(login_data: LoginRequest):
                 detail="Неверное имя пользователя или пароль"
             )
 
-        return user
-    finally:
-        conn.close()
+        # Токен несёт id, приоритет и группу, чтобы бронирование не перечитывало Users
+        return {**user, "token": create_token(user)}
 
 
 # CRUD операции для Users
-@app.post("/users/", response_model=User)
-def create_user(user: User):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO Users (name, username, password, priority, "group")
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING *;
-        """,
-        (user.name, user.username, user.password, user.priority, user.group)
-    )
-    new_user = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+# Пароль не возвращается и не попадает в кэш
+USER_COLUMNS = 'id, name, username, priority, "group"'
+
+
+@app.post("/users/")
+async def create_user(user: User):
+    async with get_session() as session:
+        result = await session.execute(
+            text(f"""
+            INSERT INTO Users (name, username, password, priority, "group")
+            VALUES (:name, :username, :password, :priority, :group)
+            RETURNING {USER_COLUMNS};
+            """),
+            {
+                "name": user.name,
+                "username": user.username,
+                "password": user.password,
+                "priority": user.priority,
+                "group": user.group
+            }
+        )
+        new_user = dict(result.mappings().one())
+        await session.commit()
+    entity_cache.set(("user", new_user['id']), new_user)
     return new_user
 
 
-@app.get("/users/{user_id}", response_model=User)
-def read_user(user_id: UUID):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM Users WHERE id = %s;", (str(user_id),))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+@app.get("/users/{user_id}")
+async def read_user(user_id: UUID):
+    user = entity_cache.get(("user", user_id))
+    if user is not None:
+        return user
+    async with get_session() as session:
+        result = await session.execute(
+            text(f"SELECT {USER_COLUMNS} FROM Users WHERE id = :id;"), {"id": user_id}
+        )
+        user = result.mappings().one_or_none()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    user = dict(user)
+    entity_cache.set(("user", user_id), user)
     return user
 
 
 # CRUD операции для Cabinets
 @app.post("/cabinets/", response_model=Cabinet)
-def create_cabinet(cabinet: Cabinet):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO Cabinets (number, floor, type, description)
-        VALUES (%s, %s, %s, %s)
-        RETURNING *;
-        """,
-        (cabinet.number, cabinet.floor, cabinet.type, cabinet.description)
-    )
-    new_cabinet = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+async def create_cabinet(cabinet: Cabinet):
+    async with get_session() as session:
+        result = await session.execute(
+            text("""
+            INSERT INTO Cabinets (number, floor, type, description)
+            VALUES (:number, :floor, :type, :description)
+            RETURNING *;
+            """),
+            {
+                "number": cabinet.number,
+                "floor": cabinet.floor,
+                "type": cabinet.type,
+                "description": cabinet.description
+            }
+        )
+        new_cabinet = dict(result.mappings().one())
+        await session.commit()
+    occupancy.add_cabinet(new_cabinet)
+    versions.bump_catalog()
+    entity_cache.set(("cabinet", new_cabinet['id']), new_cabinet)
     return new_cabinet
 
 
 @app.get("/cabinets/")
-def get_cabinets(date: Optional[str] = None, pair: Optional[int] = None):
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-
+async def get_cabinets(request: Request, date: Optional[str] = None, pair: Optional[int] = None):
+    if date and pair:
+        day = parse_date(date)
+        etag = versions.free_cabinets_etag(day, int(pair))
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        # Внутри окна индекса отвечаем из памяти, без запроса к базе
+        if occupancy.covers(day) and int(pair) in PAIR_TIMES:
+            return json_response(dumps(occupancy.free_cabinets(day, int(pair))), etag)
+    else:
+        etag = versions.catalog_etag()
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        if catalog_cache["etag"] == etag:
+            return json_response(catalog_cache["body"], etag)
+
+    async with get_session() as session:
         if date and pair:
-            # Получаем время пары
-            pair_times = {
-                1: ('08:00', '09:35'),
-                2: ('09:45', '11:20'),
-                3: ('11:30', '13:05'),
-                4: ('13:30', '15:05'),
-                5: ('15:15', '16:50'),
-                6: ('17:00', '18:35'),
-                7: ('18:45', '20:20'),
-                8: ('20:30', '22:05')
-            }
-            start_time, end_time = pair_times[int(pair)]
-
             # Получаем свободные кабинеты
-            cur.execute("""
-                SELECT c.* FROM Cabinets c
+            result = await session.execute(text(f"""
+                SELECT {CABINET_COLUMNS} FROM Cabinets c
                 WHERE c.id NOT IN (
                     SELECT pc.cabinet_id
                     FROM Pairs_Cabinets pc
-                    JOIN Pairs p ON p.id = pc.pair_id
-                    WHERE p.date = %s
-                    AND p.start_time = %s
-                    AND p.end_time = %s
+                    JOIN Pairs p ON p.id = pc.pair_id AND p.date = pc.date
+                    WHERE pc.date = :date
+                    AND p.slot = :slot
                 )
                 ORDER BY c.number;
-            """, (date, start_time, end_time))
+            """), {"date": parse_date(date), "slot": int(pair)})
         else:
             # Возвращаем все кабинеты
-            cur.execute("SELECT * FROM Cabinets ORDER BY number;")
-
-        cabinets = cur.fetchall()
-        return cabinets
-    finally:
-        conn.close()
+            result = await session.execute(
+                text(f"SELECT {CABINET_COLUMNS} FROM Cabinets ORDER BY number;")
+            )
+            body = dumps(rows_to_dicts(result.all(), CABINET_FIELDS))
+            catalog_cache["etag"], catalog_cache["body"] = etag, body
+            return json_response(body, etag)
+
+        return json_response(dumps(rows_to_dicts(result.all(), CABINET_FIELDS)), etag)
+
+
+def grid_period(start: str, end: Optional[str]) -> tuple:
+    """Период сетки: [start, end] или неделя start, не длиннее MAX_GRID_DAYS"""
+    if end is None:
+        week_start, week_end = get_week_range(start)
+        start_day, end_day = week_start.date(), week_end.date()
+    else:
+        start_day, end_day = parse_date(start), parse_date(end)
+    if end_day < start_day or (end_day - start_day).days >= MAX_GRID_DAYS:
+        raise HTTPException(status_code=400, detail="Некорректный период")
+    return start_day, end_day
+
+
+async def load_grid(start_day: date_type, end_day: date_type,
+                    floor: Optional[int], cabinet_type: Optional[str]) -> tuple:
+    """Кабинеты и маски занятости по дням: из индекса или одним запросом"""
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+
+    if occupancy.covers(start_day) and occupancy.covers(end_day):
+        cabinets, masks = occupancy.grid(days, floor, cabinet_type)
+    else:
+        async with get_session() as session:
+            result = await session.execute(text("""
+                WITH busy AS (
+                    SELECT cabinet_id, date, mask
+                    FROM Cabinet_Day_Occupancy
+                    WHERE date BETWEEN :start AND :end
+                )
+                SELECT c.id, c.number, c.floor, c.type,
+                       array_agg(b.date) FILTER (WHERE b.date IS NOT NULL) AS dates,
+                       array_agg(b.mask) FILTER (WHERE b.date IS NOT NULL) AS masks
+                FROM Cabinets c
+                LEFT JOIN busy b ON b.cabinet_id = c.id
+                WHERE (CAST(:floor AS integer) IS NULL OR c.floor = :floor)
+                AND (CAST(:type AS text) IS NULL OR c.type = :type)
+                GROUP BY c.id
+                ORDER BY c.number;
+            """), {"start": start_day, "end": end_day, "floor": floor, "type": cabinet_type})
+
+            cabinets, masks = [], []
+            for cabinet_id, number, cabinet_floor, row_type, busy_dates, busy_masks in result:
+                cabinets.append({"id": cabinet_id, "number": number,
+                                 "floor": cabinet_floor, "type": row_type})
+                by_day = dict(zip(busy_dates or (), busy_masks or ()))
+                masks.append([by_day.get(day, 0) for day in days])
+    return days, cabinets, masks
+
+
+@app.get("/cabinets/availability")
+async def get_availability(start: str, end: Optional[str] = None,
+                           floor: Optional[int] = None, type: Optional[str] = None):
+    """Сетка занятости всех кабинетов за период одним запросом.
+
+    masks[i][d] — битовая маска пар кабинета cabinets[i] в день start + d
+    (бит N-1 выставлен, если пара N занята). Без end отдаётся неделя start.
+    """
+    start_day, end_day = grid_period(start, end)
+    days, cabinets, masks = await load_grid(start_day, end_day, floor, type)
+
+    return json_response(dumps({
+        "start": start_day.isoformat(),
+        "end": end_day.isoformat(),
+        "slots": len(PAIR_TIMES),
+        "cabinets": [
+            {"id": c['id'], "number": c['number'], "floor": c['floor'], "type": c['type']}
+            for c in cabinets
+        ],
+        "masks": masks
+    }))
+
+
+@app.get("/cabinets/occupancy")
+async def get_daily_occupancy(request: Request, date: str, floor: Optional[int] = None):
+    """Сколько пар занято в каждом кабинете за день — для дашбордов и
+    подсветки карты. Кабинеты без броней в ответ не попадают."""
+    day = parse_date(date)
+    etag = versions.occupancy_etag(day)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    async with get_session() as session:
+        result = await session.execute(text("""
+            SELECT o.cabinet_id, c.number, c.floor, o.booked, o.mask
+            FROM Cabinet_Day_Occupancy o
+            JOIN Cabinets c ON c.id = o.cabinet_id
+            WHERE o.date = :date
+            AND (CAST(:floor AS integer) IS NULL OR c.floor = :floor)
+            ORDER BY c.number;
+        """), {"date": day, "floor": floor})
+        rows = result.all()
+
+    return json_response(dumps({
+        "date": day.isoformat(),
+        "slots": len(PAIR_TIMES),
+        "cabinets": [
+            {"id": cabinet_id, "number": number, "floor": cabinet_floor, "booked": booked, "mask": mask}
+            for cabinet_id, number, cabinet_floor, booked, mask in rows
+        ],
+    }), etag)
+
+
+@app.get("/cabinets/nearest_free")
+async def get_nearest_free(date: str, pair: int, near: str, type: Optional[str] = None,
+                           limit: int = Query(5, ge=1, le=MAX_NEAREST_ROOMS)):
+    """Ближайшие к точке near (вершина карты или номер кабинета) кабинеты,
+    свободные в пару pair, с расстоянием пешком по графу карты.
+
+    Кабинеты перебираются по заранее отсортированной строке расстояний и
+    только до первых limit подходящих; на карте кабинет — вершина с
+    objectName, равным его номеру."""
+    table = routing["table"]
+    if table is None:
+        raise HTTPException(status_code=503, detail="Граф карты не загружен")
+    source = table.resolve(near)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Точка на карте не найдена")
+    if pair not in PAIR_TIMES:
+        raise HTTPException(status_code=400, detail="Неизвестный номер пары")
+    day = parse_date(date)
+
+    if occupancy.covers(day):
+        def free_cabinet(number: int) -> Optional[dict]:
+            cabinet = occupancy.by_number.get(number)
+            if cabinet and occupancy.is_free(day, cabinet['id'], pair):
+                return cabinet
+            return None
+    else:
+        # Вне окна индекса — свободные кабинеты с карты одним запросом к сводке
+        numbers = [int(name) for name in table.by_name if name.isdigit()]
+        async with get_session() as session:
+            result = await session.execute(text("""
+                SELECT c.id, c.number, c.floor, c.type
+                FROM Cabinets c
+                WHERE c.number = ANY(:numbers)
+                AND NOT EXISTS (
+                    SELECT 1 FROM Cabinet_Day_Occupancy o
+                    WHERE o.date = :date AND o.cabinet_id = c.id
+                    AND o.mask & CAST(:bit AS smallint) <> 0
+                );
+            """), {"numbers": numbers, "date": day, "bit": 1 << (pair - 1)})
+            free = {row['number']: dict(row) for row in result.mappings()}
+        free_cabinet = free.get
+
+    rooms = []
+    for name, distance in table.nearest_objects(source):
+        cabinet = free_cabinet(int(name)) if name.isdigit() else None
+        if cabinet is None or (type is not None and cabinet['type'] != type):
+            continue
+        rooms.append({"id": cabinet['id'], "number": cabinet['number'], "floor": cabinet['floor'],
+                      "type": cabinet['type'], "distance": distance})
+        if len(rooms) == limit:
+            break
+
+    return json_response(dumps({
+        "near": table.ids[source],
+        "date": day.isoformat(),
+        "pair": pair,
+        "rooms": rooms,
+    }))
+
+
+@app.get("/analytics/utilization")
+async def get_utilization(request: Request, start: Optional[str] = None, end: Optional[str] = None):
+    """Загрузка кабинетов за период по этажам, типам, дням недели и парам,
+    с разбивкой по user_priority. Без start — текущий семестр."""
+    if start:
+        start_day = parse_date(start)
+        end_day = parse_date(end) if end else start_day + timedelta(days=6)
+    else:
+        _, start_day, next_start = semester_of(date_type.today())
+        end_day = next_start - timedelta(days=1)
+    if end_day < start_day or (end_day - start_day).days >= MAX_UTILIZATION_DAYS:
+        raise HTTPException(status_code=400,
+                            detail=f"Период должен быть от 1 до {MAX_UTILIZATION_DAYS} дней")
+
+    etag = versions.utilization_etag(start_day, end_day)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    cached = utilization_cache.get((start_day, end_day))
+    if cached and cached[0] == etag:
+        return json_response(cached[1], etag)
+
+    async with get_session() as session:
+        result = await session.execute(text(CUBE_SQL), {"start": start_day, "end": end_day})
+        rows = result.all()
+    body = dumps({
+        "start": start_day.isoformat(),
+        "end": end_day.isoformat(),
+        **utilization_report(build_cube(rows, start_day, end_day)),
+    })
+    utilization_cache.set((start_day, end_day), (etag, body))
+    return json_response(body, etag)
+
+
+@app.get("/cabinets/search")
+async def search_free_slots(start: str, end: Optional[str] = None,
+                            length: int = Query(1, ge=1, le=len(PAIR_TIMES)),
+                            slot_from: int = Query(1, ge=1, le=len(PAIR_TIMES)),
+                            slot_to: int = Query(len(PAIR_TIMES), ge=1, le=len(PAIR_TIMES)),
+                            floor: Optional[int] = None, type: Optional[str] = None,
+                            limit: int = Query(50, ge=1, le=500)):
+    """Кабинеты, свободные length пар подряд в пределах пар slot_from..slot_to.
+
+    Например, «лекционная на 3 этаже, пары 2–4, любой день недели»:
+    ?start=...&length=3&slot_from=2&slot_to=4&floor=3&type=lecture.
+    Без end ищется неделя start. Варианты отсортированы по дню, первой
+    паре и длине свободного промежутка (сначала самые плотные).
+    """
+    if slot_to - slot_from + 1 < length:
+        raise HTTPException(status_code=400, detail="Окно пар короче требуемой длины")
+    start_day, end_day = grid_period(start, end)
+    days, cabinets, masks = await load_grid(start_day, end_day, floor, type)
+
+    options, total = find_free_runs(busy_matrix(masks, len(days)), length, slot_from, slot_to, limit)
+    return json_response(dumps({
+        "start": start_day.isoformat(),
+        "end": end_day.isoformat(),
+        "length": length,
+        "total": total,
+        "options": [
+            {
+                "cabinet": {key: cabinets[o.cabinet][key] for key in ("id", "number", "floor", "type")},
+                "date": days[o.day].isoformat(),
+                "pair_from": o.first_slot,
+                "pair_to": o.first_slot + length - 1,
+                "start_time": PAIR_TIMES[o.first_slot][0],
+                "end_time": PAIR_TIMES[o.first_slot + length - 1][1],
+                "free_run": o.free_run,
+            }
+            for o in options
+        ]
+    }))
+
+
+@app.get("/schedule/")
+async def get_schedules(date: str, cabinet_id: Optional[List[UUID]] = Query(None),
+                        floor: Optional[int] = None):
+    """Недельное расписание нескольких кабинетов (списком id или целым этажом).
+
+    Один запрос с = ANY(...), ответ сгруппирован по кабинетам; кабинеты без
+    броней тоже попадают в ответ с пустым списком.
+    """
+    if not cabinet_id and floor is None:
+        raise HTTPException(status_code=400, detail="Нужно указать cabinet_id или floor")
+    if cabinet_id and len(cabinet_id) > MAX_BATCH_CABINETS:
+        raise HTTPException(status_code=400, detail="Слишком много кабинетов в запросе")
+    week_start, week_end = get_week_range(date)
+
+    async with get_session() as session:
+        result = await session.execute(text(f"""
+            SELECT c.id as cabinet_id, {SCHEDULE_COLUMNS}
+            FROM Cabinets c
+            LEFT JOIN (
+                Pairs_Cabinets pc
+                JOIN Pairs p ON p.id = pc.pair_id AND p.date = pc.date
+                    AND p.date BETWEEN :week_start AND :week_end
+                    AND pc.date BETWEEN :week_start AND :week_end
+                JOIN Users u ON u.id = pc.user_id
+            ) ON pc.cabinet_id = c.id
+            WHERE c.id = ANY(:cabinet_ids) OR c.floor = CAST(:floor AS integer)
+            ORDER BY c.number, p.date, p.start_time;
+        """), {
+            "cabinet_ids": cabinet_id or [],
+            "floor": floor,
+            "week_start": week_start.date(),
+            "week_end": week_end.date()
+        })
+
+        schedules = {}
+        for row in result.all():
+            items = schedules.setdefault(str(row[0]), [])
+            if row[1] is not None:
+                items.append(dict(zip(SCHEDULE_FIELDS, row[1:])))
+
+    return json_response(dumps({
+        "start": week_start.date().isoformat(),
+        "end": week_end.date().isoformat(),
+        "schedules": schedules
+    }))
+
+
+@app.get("/events/bookings")
+async def booking_events(request: Request, floor: Optional[int] = None,
+                         cabinet_id: Optional[List[UUID]] = Query(None)):
+    """Поток изменений броней (Server-Sent Events) с фильтром по этажу и кабинетам.
+
+    Каждое событие — JSON с cabinet_id, floor, date, slot, state (busy/free)
+    и user_id. Клиент, который не успевает читать, отключается и после
+    переподключения должен перечитать расписание; так же отключаются все
+    клиенты, когда сервер сам переподключился к базе и мог пропустить события.
+    """
+    subscription = broadcaster.subscribe(floor, cabinet_id)
+
+    async def stream():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if subscription.overflowed or await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: booking\ndata: {dumps(event).decode()}\n\n"
+                if subscription.overflowed and subscription.queue.empty():
+                    break
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.get("/cabinets/{cabinet_id}")
-def read_cabinet(cabinet_id: UUID):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM Cabinets WHERE id = %s;", (str(cabinet_id),))
-    cabinet = cur.fetchone()
-    cur.close()
-    conn.close()
+async def read_cabinet(cabinet_id: UUID):
+    cabinet = entity_cache.get(("cabinet", cabinet_id))
+    if cabinet is not None:
+        return cabinet
+    async with get_session() as session:
+        result = await session.execute(
+            text("SELECT * FROM Cabinets WHERE id = :id;"), {"id": cabinet_id}
+        )
+        cabinet = result.mappings().one_or_none()
     if cabinet is None:
         raise HTTPException(status_code=404, detail="Cabinet not found")
+    cabinet = dict(cabinet)
+    entity_cache.set(("cabinet", cabinet_id), cabinet)
     return cabinet
 
 
 @app.get("/cabinets/{cabinet_id}/schedule")
-def get_cabinet_schedule(cabinet_id: UUID, date: Optional[str] = None):
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-
-        if date:
-            # Получаем диапазон дат для недели
-            week_start, week_end = get_week_range(date)
-
-            cur.execute("""
-                SELECT 
-                    p.id as pair_id,
-                    p.date,
-                    p.start_time,
-                    p.end_time,
-                    u.name as user_name,
-                    u.priority as user_role,
-                    u."group" as user_group,
-                    pc.purpose
-                FROM Pairs p
-                JOIN Pairs_Cabinets pc ON p.id = pc.pair_id
-                JOIN Users u ON u.id = pc.user_id
-                WHERE pc.cabinet_id = %s
-                AND p.date BETWEEN %s AND %s
-                ORDER BY p.date, p.start_time;
-            """, (str(cabinet_id), week_start, week_end))
-
-            schedule = cur.fetchall()
-
-            # Преобразуем даты в строки для JSON
-            for item in schedule:
-                item['date'] = item['date'].strftime('%Y-%m-%d')
-                item['start_time'] = item['start_time'].strftime('%H:%M')
-                item['end_time'] = item['end_time'].strftime('%H:%M')
-
-            return schedule
-        else:
-            cur.execute("""
-                SELECT 
-                    p.id as pair_id,
-                    p.date,
-                    p.start_time,
-                    p.end_time,
-                    u.name as user_name,
-                    u.priority as user_role,
-                    u."group" as user_group,
-                    pc.purpose
-                FROM Pairs p
-                JOIN Pairs_Cabinets pc ON p.id = pc.pair_id
-                JOIN Users u ON u.id = pc.user_id
-                WHERE pc.cabinet_id = %s
-                ORDER BY p.date, p.start_time;
-            """, (str(cabinet_id),))
-
-            schedule = cur.fetchall()
-
-            # Преобразуем даты в строки для JSON
-            for item in schedule:
-                item['date'] = item['date'].strftime('%Y-%m-%d')
-                item['start_time'] = item['start_time'].strftime('%H:%M')
-                item['end_time'] = item['end_time'].strftime('%H:%M')
-
-            return schedule
-    finally:
-        conn.close()
+async def get_cabinet_schedule(request: Request, cabinet_id: UUID, date: Optional[str] = None,
+                               cursor: Optional[str] = None,
+                               limit: int = Query(SCHEDULE_PAGE_SIZE, ge=1, le=MAX_SCHEDULE_PAGE_SIZE),
+                               format: str = "json"):
+    """Расписание кабинета на неделю date или вся его история.
+
+    История отдаётся страницами по (date, start_time): курсор следующей
+    страницы приходит в заголовке X-Next-Cursor и передаётся в cursor.
+    format=ndjson отдаёт все строки (после cursor, если он задан) потоком
+    по одной JSON-строке, читая их из серверного курсора пачками.
+    """
+    params = {"cabinet_id": cabinet_id}
+    filters = ""
+    if date:
+        # Получаем диапазон дат для недели
+        week_start, week_end = get_week_range(date)
+        params["week_start"] = week_start.date()
+        params["week_end"] = week_end.date()
+        filters += (" AND p.date BETWEEN :week_start AND :week_end"
+                    " AND pc.date BETWEEN :week_start AND :week_end")
+    if cursor:
+        params["after_date"], params["after_time"] = decode_cursor(cursor)
+        # Граница по pc.date отсекает лишние секции и строки Pairs_Cabinets
+        filters += (" AND pc.date >= :after_date"
+                    " AND (p.date, p.start_time) > (:after_date, :after_time)")
+
+    query = f"""
+        SELECT {SCHEDULE_COLUMNS}
+        FROM Pairs p
+        JOIN Pairs_Cabinets pc ON p.id = pc.pair_id AND p.date = pc.date
+        JOIN Users u ON u.id = pc.user_id
+        WHERE pc.cabinet_id = :cabinet_id
+        {filters}
+        ORDER BY pc.date, p.start_time
+    """
+
+    if format == "ndjson":
+        return StreamingResponse(stream_schedule(query, params), media_type="application/x-ndjson")
+
+    paged = date is None
+    etag = versions.schedule_etag(cabinet_id, params.get("week_start"),
+                                  f"{cursor or ''}.{limit}" if paged else "")
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    if paged:
+        # На одну строку больше, чтобы понять, есть ли следующая страница
+        query += " LIMIT :limit"
+        params["limit"] = limit + 1
+    async with get_session() as session:
+        result = await session.execute(text(query), params)
+        rows = result.all()
+
+    response = json_response(dumps(rows_to_dicts(rows[:limit] if paged else rows, SCHEDULE_FIELDS)), etag)
+    if paged and len(rows) > limit:
+        last = rows[limit - 1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.date, last.start_time)
+    return response
+
+
+async def stream_schedule(query: str, params: dict):
+    """Строки расписания по мере чтения; в памяти не больше одной пачки"""
+    async with get_session() as session:
+        result = await session.stream(text(query), params)
+        async for rows in result.partitions(STREAM_BATCH_SIZE):
+            yield b"".join(dumps(dict(zip(SCHEDULE_FIELDS, row))) + b"\n" for row in rows)
 
 
 # CRUD операции для Pairs
 @app.post("/pairs/")
-def create_pair(pair: PairCreate):
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO Pairs (date, start_time, end_time)
-            VALUES (%s, %s, %s)
-            RETURNING id, date, start_time, end_time;
-            """,
-            (pair.date, pair.start_time, pair.end_time)
+async def create_pair(pair: PairCreate):
+    start_time, end_time = parse_time(pair.start_time), parse_time(pair.end_time)
+    slot = SLOT_BY_TIMES.get((start_time, end_time))
+    if slot is None:
+        raise HTTPException(status_code=400, detail="Время не совпадает ни с одной парой")
+    pair_date = parse_date(pair.date)
+    await ensure_partitions_for(pair_date, pair_date)
+
+    async with get_session() as session:
+        # Пара на дату существует в одном экземпляре: повторный запрос
+        # возвращает уже созданную строку (DO UPDATE нужен ради RETURNING)
+        result = await session.execute(
+            text("""
+            INSERT INTO Pairs (date, slot, start_time, end_time)
+            VALUES (:date, :slot, :start_time, :end_time)
+            ON CONFLICT (date, slot) DO UPDATE SET slot = EXCLUDED.slot
+            RETURNING id, date, slot, start_time, end_time;
+            """),
+            {
+                "date": pair_date,
+                "slot": slot,
+                "start_time": start_time,
+                "end_time": end_time
+            }
         )
-        new_pair = cur.fetchone()
-        conn.commit()
+        new_pair = dict(result.mappings().one())
+        await session.commit()
         return new_pair
-    finally:
-        conn.close()
 
 
-# В main.py обновите эндпоинт pairs_cabinets
+@app.post("/pairs/import")
+async def import_pairs(request: Request, user: TokenUser = Depends(current_user)):
+    """Массовая загрузка расписания: CSV или JSON со строками
+    date, pair, cabinet, username, purpose. Возвращает отчёт по строкам.
 
-@app.post("/pairs_cabinets/")
-def create_pair_cabinet(pair_cabinet: PairCabinet):
-    conn = get_db_connection()
+    Строки бронируются от имени и с приоритетом указанных в них
+    пользователей, поэтому загрузка доступна только диспетчеру."""
+    if user.priority != "dispetcher":
+        raise HTTPException(status_code=403, detail="Импорт расписания доступен только диспетчеру")
     try:
-        cur = conn.cursor()
-
-        # Сначала получаем информацию о паре, которую пытаемся забронировать
-        cur.execute(
-            """
-            SELECT date, start_time, end_time
-            FROM Pairs
-            WHERE id = %s
-            """,
-            (str(pair_cabinet.pair_id),)
-        )
-        new_pair = cur.fetchone()
-
-        if not new_pair:
-            raise HTTPException(status_code=404, detail="Пара не найдена")
-
-        # Получаем приоритет текущего пользователя
-        cur.execute(
-            "SELECT priority FROM Users WHERE id = %s",
-            (str(pair_cabinet.user_id),)
-        )
-        current_user = cur.fetchone()
-        if not current_user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-
-        # Проверяем существующие бронирования для этого кабинета в это время
-        cur.execute(
-            """
-            SELECT pc.pair_id, u.priority as user_priority
-            FROM Pairs_Cabinets pc
-            JOIN Pairs p ON p.id = pc.pair_id
-            JOIN Users u ON u.id = pc.user_id
-            WHERE pc.cabinet_id = %s
-            AND p.date = %s
-            AND p.start_time = %s
-            AND p.end_time = %s
-            """,
-            (
-                str(pair_cabinet.cabinet_id),
-                new_pair['date'],
-                new_pair['start_time'],
-                new_pair['end_time']
-            )
-        )
-
-        existing_booking = cur.fetchone()
-
-        priorities = {
-            'dispetcher': 4,
-            'prepod': 3,
-            'union': 2,
-            'prostoi-smertni': 1
-        }
-
-        current_priority = priorities[current_user['priority']]
-
-        if existing_booking:
-            existing_priority = priorities[existing_booking['user_priority']]
-
-            # Если приоритет текущего пользователя ниже или равен существующему
-            if current_priority <= existing_priority:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Недостаточно прав для изменения этой брони"
-                )
+        rows = read_rows(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Не удалось разобрать файл: {e}")
+
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        report = await import_timetable(raw.driver_connection, rows)
+
+    if report["imported"]:
+        versions.reset()
+        await warm_occupancy()
+    return report
+
+
+# Бронирование одним запросом. ON CONFLICT блокирует занятую строку, и условие
+# приоритета проверяется уже по ней, так что две одновременные брони одного
+# кабинета не могут обе пройти. preempted = true выставляет только ветка
+# DO UPDATE, поэтому RETURNING записанной строки говорит, была ли вытеснена
+# чужая бронь, в том числе закоммиченная уже после начала запроса.
+BOOK_PAIR_CABINET_SQL = """
+    WITH pair AS (
+        SELECT id, date, slot FROM Pairs WHERE id = :pair_id
+    ),
+    booking AS (
+        INSERT INTO Pairs_Cabinets (pair_id, date, cabinet_id, user_id, purpose)
+        SELECT pair.id, pair.date, :cabinet_id, :user_id, :purpose
+        FROM pair
+        ON CONFLICT (pair_id, cabinet_id, date) DO UPDATE
+        SET user_id = EXCLUDED.user_id, purpose = EXCLUDED.purpose, preempted = true
+        WHERE CAST(:priority AS user_priority)
+            > (SELECT priority FROM Users WHERE id = Pairs_Cabinets.user_id)
+        RETURNING pair_id, cabinet_id, user_id, purpose, preempted
+    )
+    SELECT
+        pair.date,
+        pair.slot,
+        booking.*
+    FROM (SELECT 1) AS one
+    LEFT JOIN pair ON true
+    LEFT JOIN booking ON true;
+"""
 
-            # Если приоритет выше - удаляем существующее бронирование
-            cur.execute(
-                """
-                DELETE FROM Pairs_Cabinets 
-                WHERE pair_id = %s AND cabinet_id = %s
-                """,
-                (str(existing_booking['pair_id']), str(pair_cabinet.cabinet_id))
-            )
 
-        # Создаем новое бронирование
-        cur.execute(
-            """
-            INSERT INTO Pairs_Cabinets (pair_id, cabinet_id, user_id, purpose)
-            VALUES (%s, %s, %s, %s)
-            RETURNING pair_id, cabinet_id, user_id, purpose;
-            """,
-            (
-                str(pair_cabinet.pair_id),
-                str(pair_cabinet.cabinet_id),
-                str(pair_cabinet.user_id),
-                pair_cabinet.purpose
-            )
-        )
-
-        new_pair_cabinet = cur.fetchone()
-        conn.commit()
-        return new_pair_cabinet
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+@app.post("/pairs_cabinets/")
+async def create_pair_cabinet(pair_cabinet: PairCabinet,
+                              user: TokenUser = Depends(current_user)):
+    """Бронирует кабинет на пару от имени владельца токена. result в ответе:
+    won — кабинет был свободен, preempted — вытеснена бронь с меньшим
+    приоритетом, lost — кабинет занят бронью с приоритетом не ниже (409,
+    в winner_priority — приоритет этой брони)."""
+    if pair_cabinet.user_id is not None and pair_cabinet.user_id != user.id:
+        raise HTTPException(status_code=403, detail="Нельзя бронировать от имени другого пользователя")
+
+    async with get_session() as session:
+        try:
+            result = await session.execute(text(BOOK_PAIR_CABINET_SQL), {
+                "pair_id": pair_cabinet.pair_id,
+                "cabinet_id": pair_cabinet.cabinet_id,
+                "user_id": user.id,
+                "priority": user.priority,
+                "purpose": pair_cabinet.purpose
+            })
+            booking = result.mappings().one()
+            await session.commit()
+        except IntegrityError as e:
+            if "user_id" in str(e.orig):
+                raise HTTPException(status_code=404, detail="Пользователь не найден")
+            raise HTTPException(status_code=404, detail="Кабинет не найден")
+
+        if booking['date'] is None:
+            raise HTTPException(status_code=404, detail="Пара не найдена")
+        if booking['pair_id'] is None:
+            # Бронь-победитель уже закоммичена, её видно новым снимком
+            winner = await session.execute(text("""
+                SELECT u.priority::text
+                FROM Pairs_Cabinets pc
+                JOIN Users u ON u.id = pc.user_id
+                WHERE pc.pair_id = :pair_id AND pc.cabinet_id = :cabinet_id AND pc.date = :date
+            """), {"pair_id": pair_cabinet.pair_id, "cabinet_id": pair_cabinet.cabinet_id,
+                   "date": booking['date']})
+            return JSONResponse(status_code=409, content={
+                "pair_id": str(pair_cabinet.pair_id),
+                "cabinet_id": str(pair_cabinet.cabinet_id),
+                "result": "lost",
+                "winner_priority": winner.scalar(),
+                "detail": "Недостаточно прав для изменения этой брони",
+            })
+
+    occupancy.mark_busy(booking['date'], pair_cabinet.cabinet_id, booking['slot'])
+    versions.bump_booking(pair_cabinet.cabinet_id, booking['date'])
+    return {
+        "pair_id": booking['pair_id'],
+        "cabinet_id": booking['cabinet_id'],
+        "user_id": booking['user_id'],
+        "purpose": booking['purpose'],
+        "result": "preempted" if booking['preempted'] else "won"
+    }
 
 
 # Запуск сервера
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,125 @@
+"""Архивация законченных семестров.
+
+Для каждого семестра, закончившегося до --before (по умолчанию — начало
+текущего), секции pairs_<семестр> и pairs_cabinets_<семестр>
+отсоединяются от родительских таблиц одной транзакцией, выгружаются
+в <out>/<семестр>/*.csv.gz (COPY ... CSV HEADER) вместе с manifest.json
+и удаляются; строки сводки занятости за семестр тоже удаляются. Рабочие
+запросы архивные строки больше не видят и по ним не сканируют.
+
+Вернуть семестр: создать секции через partitions.partition_ddl, залить
+файлы обратно COPY ... FROM (сначала pairs, затем pairs_cabinets) и
+перестроить сводку: occupancy_summary.py --fix за даты семестра.
+
+Запуск:
+    python archive.py --out /var/backups/bronka --dry-run
+    python archive.py --out /var/backups/bronka --before 2026-02-01
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+from datetime import date
+from typing import List
+
+from partitions import PARTITIONED_TABLES, Semester, semester_of
+
+_SUFFIX = re.compile(r"^pairs_(\d{4})_(spring|autumn)$")
+
+
+async def attached_semesters(conn) -> List[Semester]:
+    """Семестры, у которых есть секция Pairs, по возрастанию"""
+    names = await conn.fetch("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'pairs'::regclass
+    """)
+    semesters = []
+    for row in names:
+        match = _SUFFIX.match(row["relname"])
+        if match:
+            year, season = int(match[1]), match[2]
+            semesters.append(semester_of(date(year, 2 if season == "spring" else 8, 1)))
+    return sorted(semesters, key=lambda s: s[1])
+
+
+async def detach(conn, semester: Semester):
+    suffix, start, end = semester
+    async with conn.transaction():
+        await conn.execute(f"ALTER TABLE pairs_cabinets DETACH PARTITION pairs_cabinets_{suffix}")
+        # Отсоединённая таблица сохраняет копию внешнего ключа на Pairs,
+        # а с ним секцию pairs_<семестр> отсоединить нельзя
+        constraints = await conn.fetch(f"""
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = 'pairs_cabinets_{suffix}'::regclass
+            AND contype = 'f' AND confrelid = 'pairs'::regclass
+        """)
+        for row in constraints:
+            await conn.execute(
+                f'ALTER TABLE pairs_cabinets_{suffix} DROP CONSTRAINT "{row["conname"]}"')
+        await conn.execute(f"ALTER TABLE pairs DETACH PARTITION pairs_{suffix}")
+        # Сводка занятости не секционирована, её строки за семестр удаляются
+        await conn.execute(
+            "DELETE FROM Cabinet_Day_Occupancy WHERE date >= $1 AND date < $2", start, end)
+
+
+async def export(conn, table: str, path: str) -> int:
+    with gzip.open(path, "wb") as f:
+        async def write(chunk: bytes):
+            f.write(chunk)
+
+        status = await conn.copy_from_table(table, output=write, format="csv", header=True)
+    return int(status.split()[-1])
+
+
+async def archive_semester(conn, semester: Semester, out_dir: str, keep_tables: bool) -> dict:
+    suffix, start, end = semester
+    target = os.path.join(out_dir, suffix)
+    os.makedirs(target, exist_ok=True)
+
+    await detach(conn, semester)
+    manifest = {"semester": suffix, "start": str(start), "end": str(end), "files": {}}
+    for table in PARTITIONED_TABLES:
+        name = f"{table}_{suffix}"
+        rows = await export(conn, name, os.path.join(target, f"{table}.csv.gz"))
+        manifest["files"][table] = {"file": f"{table}.csv.gz", "rows": rows}
+    with open(os.path.join(target, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    if not keep_tables:
+        await conn.execute(f"DROP TABLE pairs_cabinets_{suffix}, pairs_{suffix}")
+    manifest["dropped"] = not keep_tables
+    return manifest
+
+
+async def main(args):
+    import asyncpg
+    from config import get_db_url
+
+    before = date.fromisoformat(args.before) if args.before else semester_of(date.today())[1]
+    conn = await asyncpg.connect(args.dsn or get_db_url().replace("+asyncpg", ""))
+    try:
+        finished = [s for s in await attached_semesters(conn) if s[2] <= before]
+        if args.dry_run:
+            report = [{"semester": s[0], "start": str(s[1]), "end": str(s[2])} for s in finished]
+        else:
+            report = [await archive_semester(conn, s, args.out, args.keep_tables) for s in finished]
+    finally:
+        await conn.close()
+    print(json.dumps({"before": str(before), "semesters": report}, ensure_ascii=False, indent=2))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="archive", help="каталог для выгрузок")
+    parser.add_argument("--before", default="", help="архивировать семестры, закончившиеся до этой даты")
+    parser.add_argument("--keep-tables", action="store_true", help="не удалять отсоединённые таблицы")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет заархивировано")
+    parser.add_argument("--dsn", default="", help="по умолчанию из настроек DB_*")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,76 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from fastapi import Header, HTTPException
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Без AUTH_SECRET ключ генерируется при старте: токены живут до перезапуска
+# и не принимаются другими воркерами
+_secret = (settings.AUTH_SECRET or secrets.token_hex(32)).encode()
+if not settings.AUTH_SECRET:
+    logger.warning("AUTH_SECRET не задан: ключ подписи случайный, токены не переживут "
+                   "перезапуск и не будут приниматься другими воркерами")
+
+
+class TokenUser(NamedTuple):
+    id: UUID
+    priority: str
+    group: str
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_secret, payload.encode(), hashlib.sha256).digest())
+
+
+def create_token(user: dict) -> str:
+    """Подписанный токен с id, приоритетом и группой пользователя"""
+    payload = _b64encode(json.dumps({
+        "sub": str(user["id"]),
+        "priority": user["priority"],
+        "group": user["group"],
+        "exp": int(time.time()) + settings.AUTH_TOKEN_TTL,
+    }, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> TokenUser:
+    """Проверяет подпись и срок действия без обращения к базе"""
+    payload, _, signature = token.partition(".")
+    # compare_digest на str падает на не-ASCII, поэтому сравниваются байты
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        raise ValueError("bad signature")
+    data = json.loads(_b64decode(payload))
+    if data["exp"] < time.time():
+        raise ValueError("token expired")
+    return TokenUser(UUID(data["sub"]), data["priority"], data["group"])
+
+
+def current_user(authorization: Optional[str] = Header(None)) -> TokenUser:
+    """Зависимость FastAPI: пользователь из заголовка Authorization: Bearer <token>"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Требуется авторизация",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return verify_token(token)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=401, detail="Недействительный токен",
+                            headers={"WWW-Authenticate": "Bearer"})
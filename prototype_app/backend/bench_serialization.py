@@ -0,0 +1,75 @@
+"""Микробенчмарк сериализации расписания: стоимость на 10 000 строк.
+
+before — прежний путь: строки-словари, strftime для даты и времени в
+каждой строке и стандартная сериализация FastAPI (jsonable_encoder +
+json.dumps). after — кортежи с уже отформатированными в SQL полями и
+orjson, как в fast_json.
+
+Запуск:
+    python bench_serialization.py [число строк]
+"""
+import json
+import sys
+import timeit
+import uuid
+from datetime import date, time, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from fast_json import SCHEDULE_FIELDS, dumps, rows_to_dicts
+
+ROWS = 10_000
+
+
+def make_rows(n: int):
+    """Одни и те же данные в двух видах: как отдавал RealDictCursor и как отдаёт SQL с to_char"""
+    dict_rows, tuple_rows = [], []
+    for i in range(n):
+        pair_id, day = uuid.uuid4(), date(2026, 9, 1) + timedelta(days=i % 120)
+        start, end = time(8, 0), time(9, 35)
+        dict_rows.append({
+            "pair_id": pair_id, "date": day, "start_time": start, "end_time": end,
+            "user_name": "Иванов И.И.", "user_role": "prepod", "user_group": "6101",
+            "purpose": "лекция",
+        })
+        tuple_rows.append((
+            pair_id, day.isoformat(), start.strftime('%H:%M'), end.strftime('%H:%M'),
+            "Иванов И.И.", "prepod", "6101", "лекция",
+        ))
+    return dict_rows, tuple_rows
+
+
+def before(dict_rows) -> bytes:
+    rows = [dict(row) for row in dict_rows]
+    for row in rows:
+        row['date'] = row['date'].strftime('%Y-%m-%d')
+        row['start_time'] = row['start_time'].strftime('%H:%M')
+        row['end_time'] = row['end_time'].strftime('%H:%M')
+    return json.dumps(jsonable_encoder(rows)).encode()
+
+
+def after(tuple_rows) -> bytes:
+    return dumps(rows_to_dicts(tuple_rows, SCHEDULE_FIELDS))
+
+
+def measure(func, rows, n: int) -> float:
+    """Лучшее время одного прогона, в миллисекундах на ROWS строк"""
+    runs = timeit.repeat(lambda: func(rows), number=1, repeat=5)
+    return min(runs) * 1000 * ROWS / n
+
+
+def main(n: int = ROWS):
+    dict_rows, tuple_rows = make_rows(n)
+    assert json.loads(before(dict_rows)) == json.loads(after(tuple_rows))
+    before_ms = measure(before, dict_rows, n)
+    after_ms = measure(after, tuple_rows, n)
+    print(json.dumps({
+        "rows": n,
+        "before_ms_per_10k": round(before_ms, 2),
+        "after_ms_per_10k": round(after_ms, 2),
+        "speedup": round(before_ms / after_ms, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
@@ -0,0 +1,58 @@
+import os
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    DB_HOST: str = "localhost"
+    DB_PORT: int = 5432
+    DB_NAME: str = "fast_api"
+    DB_USER: str = "postgres"
+    DB_PASSWORD: str = "postgres"
+
+    # Пул соединений
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 20
+    # Сколько секунд ждать свободное соединение, прежде чем ответить 503
+    DB_POOL_TIMEOUT: float = 5.0
+    # Соединения старше этого времени (с) переоткрываются
+    DB_POOL_RECYCLE: int = 1800
+
+    # Окно дат индекса занятости (occupancy.py) относительно сегодняшнего дня
+    OCCUPANCY_DAYS_BACK: int = 7
+    OCCUPANCY_DAYS_AHEAD: int = 60
+
+    # Ключ подписи токенов, общий для всех воркеров; пустой — случайный
+    # на каждый процесс (только для разработки, при старте пишется предупреждение)
+    AUTH_SECRET: str = ""
+    AUTH_TOKEN_TTL: int = 12 * 3600
+
+    # Кэш пользователей и кабинетов (entity_cache.py)
+    ENTITY_CACHE_SIZE: int = 10000
+    ENTITY_CACHE_TTL: float = 300.0
+
+    # Кэш отчётов о загрузке (utilization.py): сколько периодов хранить
+    UTILIZATION_CACHE_SIZE: int = 32
+
+    # Граф карты корпуса для /route (routing.py); нет файла — маршруты выключены
+    GRAPH_DATA_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                                        "frontend_map", "src", "store", "graphData.ts")
+    ROUTE_CACHE_SIZE: int = 4096
+
+    # Журнал медленных запросов (slow_queries.py); 0 — выключен
+    SLOW_QUERY_MS: float = 200.0
+    # Доля медленных SELECT, для которых снимается EXPLAIN ANALYZE
+    SLOW_QUERY_EXPLAIN_RATE: float = 0.0
+    # Файл для записей в формате JSON Lines; пустой — только лог и память
+    SLOW_QUERY_LOG_FILE: str = ""
+
+    model_config = SettingsConfigDict(
+        env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+    )
+
+
+settings = Settings()
+
+
+def get_db_url():
+    return (f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@"
+            f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}")
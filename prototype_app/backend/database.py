@@ -0,0 +1,134 @@
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from config import get_db_url, settings
+from slow_queries import slow_log
+
+DATABASE_URL = get_db_url()
+
+# Пул живёт внутри движка: pool_size соединений держатся постоянно,
+# ещё max_overflow открываются под нагрузкой, дольше pool_timeout
+# запрос в очереди не ждёт (sqlalchemy.exc.TimeoutError -> 503)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=settings.DB_POOL_MIN_SIZE,
+    max_overflow=settings.DB_POOL_MAX_SIZE - settings.DB_POOL_MIN_SIZE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+pool_counters = {
+    "connects_total": 0,
+    "checkouts_total": 0,
+    "invalidated_total": 0,
+    "timeouts_total": 0,
+}
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    pool_counters["connects_total"] += 1
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_counters["checkouts_total"] += 1
+
+
+@event.listens_for(engine.sync_engine, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_counters["invalidated_total"] += 1
+
+
+class RequestStats:
+    """Работа с базой в рамках одного HTTP-запроса; заполняется событиями ниже"""
+    __slots__ = ("scope", "queries", "rows", "query_durations", "acquire_durations")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope if scope is not None else {}
+        self.queries = 0
+        self.rows = 0
+        self.query_durations: List[float] = []
+        self.acquire_durations: List[float] = []
+
+    @property
+    def route(self) -> Optional[str]:
+        """Шаблон пути (/cabinets/{cabinet_id}): роутер кладёт маршрут в scope
+        до вызова обработчика, поэтому он известен уже во время запросов к базе"""
+        route = self.scope.get("route")
+        return route.path if route is not None else None
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время старта хранится в контексте выполнения: после ошибки
+    # after_cursor_execute не вызывается, и контекст уходит вместе с ним
+    context._query_start = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_start
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.rows += max(cursor.rowcount, 0)
+        stats.query_durations.append(duration)
+    if slow_log.enabled() and duration * 1000 >= slow_log.threshold_ms:
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        slow_log.record(statement, parameters, getattr(context.compiled, "positiontup", None),
+                        duration, stats.route if stats is not None else None,
+                        None if executemany else explain)
+
+
+async def explain(statement: str, args: tuple):
+    """Выполняет EXPLAIN на отдельном соединении в обход событий выше"""
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        return await raw.driver_connection.fetchval(statement, *args)
+
+
+@asynccontextmanager
+async def get_session():
+    """Сессия на время одного запроса; незакоммиченное откатывается при выходе"""
+    async with async_session_maker() as session:
+        stats = request_stats.get()
+        if stats is not None:
+            # Соединение берётся сразу, чтобы отдельно измерить ожидание пула
+            started = time.perf_counter()
+            await session.connection()
+            stats.acquire_durations.append(time.perf_counter() - started)
+        yield session
+
+
+async def warm_pool():
+    """Заранее открывает DB_POOL_MIN_SIZE соединений"""
+    connections = [await engine.connect() for _ in range(settings.DB_POOL_MIN_SIZE)]
+    for conn in connections:
+        await conn.execute(text("SELECT 1"))
+        await conn.close()
+
+
+def pool_stats() -> dict:
+    pool = engine.pool
+    return {
+        "min_size": settings.DB_POOL_MIN_SIZE,
+        "max_size": settings.DB_POOL_MAX_SIZE,
+        "timeout": settings.DB_POOL_TIMEOUT,
+        "open": pool.checkedin() + pool.checkedout(),
+        "idle": pool.checkedin(),
+        "in_use": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        **pool_counters,
+    }
@@ -0,0 +1,215 @@
+"""Генератор синтетических данных кампуса для проверки на объёме.
+
+Заполняет схему, созданную /init/, через COPY: корпуса и этажи с
+кабинетами, пользователей всех четырёх уровней user_priority и несколько
+семестров пар с неравномерной загрузкой. Популярность кабинетов задаётся
+логнормальным весом, середина дня и будни заняты плотнее, воскресенье
+свободно. При одинаковых --seed и --scale результат совпадает до байта,
+включая UUID.
+
+Объём задаётся множителем --scale относительно сегодняшнего (BASE_*):
+1 — как сейчас, 10 и 100 — для оценки железа и планов запросов.
+
+Запуск (схема уже создана через POST /init/, API лучше перезапустить
+после загрузки, чтобы он заново прогрел индекс занятости):
+    python datagen.py --scale 10 --seed 63 --truncate
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from occupancy import PAIR_TIMES, SLOT_BY_TIMES
+from occupancy_summary import rebuild as rebuild_summary
+from partitions import ensure_partitions
+
+# Сегодняшний объём, которому соответствует --scale 1
+BASE_CABINETS = 150
+BASE_USERS = 3000
+
+FLOORS_PER_BUILDING = 9
+ROOMS_PER_FLOOR = 40
+CABINET_TYPES = (("lecture", 0.25), ("seminar", 0.4), ("lab", 0.2), ("computer", 0.15))
+
+# Доля пользователей каждого уровня и доля броней, которые они делают
+PRIORITY_SHARE = {"prostoi-smertni": 0.80, "union": 0.05, "prepod": 0.13, "dispetcher": 0.02}
+BOOKING_SHARE = {"prostoi-smertni": 0.05, "union": 0.10, "prepod": 0.70, "dispetcher": 0.15}
+
+# Средняя загрузка и её перекосы по парам и дням недели (пн = 0)
+BASE_OCCUPANCY = 0.35
+SLOT_WEIGHT = {1: 0.8, 2: 1.4, 3: 1.5, 4: 1.4, 5: 1.1, 6: 0.8, 7: 0.5, 8: 0.2}
+WEEKDAY_WEIGHT = (1.1, 1.15, 1.15, 1.1, 1.0, 0.5, 0.0)
+
+# Номер пары -> (начало, конец) объектами time, как их ждёт COPY
+TIMES_BY_SLOT = {slot: times for times, slot in SLOT_BY_TIMES.items()}
+
+PURPOSES = ("лекция", "практика", "лабораторная", "консультация", "экзамен", "собрание")
+FIRST_NAMES = ("Александр", "Мария", "Дмитрий", "Анна", "Сергей", "Елена", "Иван", "Ольга")
+LAST_NAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов", "Новиков")
+
+
+def semester_ranges(start_year: int, semesters: int) -> List[Tuple[date, date]]:
+    """Осенний семестр 1 сентября – 27 декабря, весенний 9 февраля – 31 мая"""
+    ranges = []
+    for i in range(semesters):
+        year = start_year + (i + 1) // 2
+        if i % 2 == 0:
+            ranges.append((date(year, 9, 1), date(year, 12, 27)))
+        else:
+            ranges.append((date(year, 2, 9), date(year, 5, 31)))
+    return ranges
+
+
+class CampusGenerator:
+    def __init__(self, scale: float, seed: int, start_year: int, semesters: int):
+        self.rng = random.Random(seed)
+        self.cabinet_count = max(1, round(BASE_CABINETS * scale))
+        self.user_count = max(len(PRIORITY_SHARE), round(BASE_USERS * scale))
+        self.days = [
+            start + timedelta(days=d)
+            for start, end in semester_ranges(start_year, semesters)
+            for d in range((end - start).days + 1)
+        ]
+
+    def _uuid(self) -> uuid.UUID:
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def users(self) -> Tuple[List[tuple], Dict[str, List[uuid.UUID]]]:
+        rows, by_priority = [], {priority: [] for priority in PRIORITY_SHARE}
+        priorities = list(PRIORITY_SHARE)
+        for i in range(self.user_count):
+            # Первые пользователи покрывают все уровни даже на крошечном объёме
+            priority = priorities[i] if i < len(priorities) else \
+                self.rng.choices(priorities, PRIORITY_SHARE.values())[0]
+            user_id = self._uuid()
+            name = f"{self.rng.choice(LAST_NAMES)} {self.rng.choice(FIRST_NAMES)}"
+            group = f"{6100 + self.rng.randrange(400)}-{self.rng.randrange(1, 5)}"
+            rows.append((user_id, name, f"user{i:07d}", f"pass{i:07d}", priority, group))
+            by_priority[priority].append(user_id)
+        return rows, by_priority
+
+    def cabinets(self) -> Tuple[List[tuple], List[float]]:
+        rows, weights = [], []
+        types, type_share = zip(*CABINET_TYPES)
+        per_building = FLOORS_PER_BUILDING * ROOMS_PER_FLOOR
+        for i in range(self.cabinet_count):
+            building, rest = divmod(i, per_building)
+            floor, room = divmod(rest, ROOMS_PER_FLOOR)
+            number = (building + 1) * 10000 + (floor + 1) * 100 + room + 1
+            cabinet_type = self.rng.choices(types, type_share)[0]
+            rows.append((self._uuid(), number, building * FLOORS_PER_BUILDING + floor + 1,
+                         cabinet_type, f"Корпус {building + 1}, {cabinet_type}"))
+            weights.append(self.rng.lognormvariate(0, 0.6))
+        mean = sum(weights) / len(weights)
+        return rows, [w / mean for w in weights]
+
+    def pairs(self) -> List[tuple]:
+        return [
+            (self._uuid(), day, slot, *TIMES_BY_SLOT[slot])
+            for day in self.days
+            for slot in PAIR_TIMES
+        ]
+
+    def bookings(self, pairs: List[tuple], cabinets: List[tuple], weights: List[float],
+                 users: Dict[str, List[uuid.UUID]]) -> Iterator[tuple]:
+        """Брони по всем (кабинет, пара); вероятность — произведение весов"""
+        rng = self.rng
+        priorities = [p for p in BOOKING_SHARE if users[p]]
+        priority_weights = [BOOKING_SHARE[p] for p in priorities]
+        cabinet_ids = [c[0] for c in cabinets]
+        for pair_id, day, slot, _, _ in pairs:
+            factor = BASE_OCCUPANCY * SLOT_WEIGHT[slot] * WEEKDAY_WEIGHT[day.weekday()]
+            if factor == 0:
+                continue
+            for cabinet_id, weight in zip(cabinet_ids, weights):
+                if rng.random() < min(0.95, factor * weight):
+                    priority = rng.choices(priorities, priority_weights)[0]
+                    yield pair_id, day, cabinet_id, rng.choice(users[priority]), rng.choice(PURPOSES)
+
+
+async def load(conn, generator: CampusGenerator, truncate: bool) -> dict:
+    timings, counts = {}, {}
+    await ensure_partitions(conn.execute, generator.days[0], generator.days[-1])
+    async with conn.transaction():
+        if truncate:
+            await conn.execute("TRUNCATE Cabinet_Day_Occupancy, Pairs_Cabinets, Pairs, Cabinets, Users")
+        # NOTIFY и обновление сводки на каждую из миллионов строк не нужны:
+        # сводка пересчитывается одним запросом в конце
+        await conn.execute("ALTER TABLE Pairs_Cabinets DISABLE TRIGGER trg_pairs_cabinets_notify")
+        await conn.execute("ALTER TABLE Pairs_Cabinets DISABLE TRIGGER trg_pairs_cabinets_occupancy")
+
+        started = time.perf_counter()
+        users, by_priority = generator.users()
+        await conn.copy_records_to_table(
+            "users", records=users,
+            columns=("id", "name", "username", "password", "priority", "group"))
+        timings["users_s"], counts["users"] = time.perf_counter() - started, len(users)
+
+        started = time.perf_counter()
+        cabinets, weights = generator.cabinets()
+        await conn.copy_records_to_table(
+            "cabinets", records=cabinets, columns=("id", "number", "floor", "type", "description"))
+        timings["cabinets_s"], counts["cabinets"] = time.perf_counter() - started, len(cabinets)
+
+        started = time.perf_counter()
+        pairs = generator.pairs()
+        await conn.copy_records_to_table(
+            "pairs", records=pairs, columns=("id", "date", "slot", "start_time", "end_time"))
+        timings["pairs_s"], counts["pairs"] = time.perf_counter() - started, len(pairs)
+
+        started = time.perf_counter()
+        bookings = 0
+
+        def counted(records):
+            nonlocal bookings
+            for record in records:
+                bookings += 1
+                yield record
+
+        await conn.copy_records_to_table(
+            "pairs_cabinets",
+            records=counted(generator.bookings(pairs, cabinets, weights, by_priority)),
+            columns=("pair_id", "date", "cabinet_id", "user_id", "purpose"))
+        timings["bookings_s"], counts["bookings"] = time.perf_counter() - started, bookings
+
+        started = time.perf_counter()
+        counts["summary_rows"] = await rebuild_summary(conn)
+        timings["summary_s"] = time.perf_counter() - started
+
+        await conn.execute("ALTER TABLE Pairs_Cabinets ENABLE TRIGGER trg_pairs_cabinets_notify")
+        await conn.execute("ALTER TABLE Pairs_Cabinets ENABLE TRIGGER trg_pairs_cabinets_occupancy")
+    await conn.execute("ANALYZE Users, Cabinets, Pairs, Pairs_Cabinets, Cabinet_Day_Occupancy")
+    return {**counts, **{k: round(v, 2) for k, v in timings.items()}}
+
+
+async def main(args):
+    import asyncpg
+    from config import get_db_url
+
+    generator = CampusGenerator(args.scale, args.seed, args.start_year, args.semesters)
+    conn = await asyncpg.connect(args.dsn or get_db_url().replace("+asyncpg", ""))
+    try:
+        report = await load(conn, generator, args.truncate)
+    finally:
+        await conn.close()
+    report.update(scale=args.scale, seed=args.seed, days=len(generator.days))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=63)
+    parser.add_argument("--start-year", type=int, default=2025, help="год первого (осеннего) семестра")
+    parser.add_argument("--semesters", type=int, default=2)
+    parser.add_argument("--truncate", action="store_true", help="очистить таблицы перед загрузкой")
+    parser.add_argument("--dsn", default="", help="по умолчанию из настроек DB_*")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,69 @@
+import secrets
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Request, Response
+
+
+class VersionClock:
+    """Счётчики версий каталога и броней, из которых собираются ETag.
+
+    Счётчики только растут, поэтому сумма счётчиков по дням недели тоже
+    меняется при любой брони и годится как версия недельного расписания.
+    epoch меняется при старте процесса и при массовых изменениях, чтобы
+    старые ETag не совпали с новыми значениями счётчиков.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.epoch = secrets.token_hex(4)
+        self.catalog = 0
+        self.days: Dict[date, int] = {}
+        self.cabinets: Dict[UUID, int] = {}
+        self.cabinet_days: Dict[Tuple[UUID, date], int] = {}
+
+    def bump_catalog(self):
+        self.catalog += 1
+
+    def bump_booking(self, cabinet_id: UUID, day: date):
+        self.days[day] = self.days.get(day, 0) + 1
+        self.cabinets[cabinet_id] = self.cabinets.get(cabinet_id, 0) + 1
+        key = (cabinet_id, day)
+        self.cabinet_days[key] = self.cabinet_days.get(key, 0) + 1
+
+    def catalog_etag(self) -> str:
+        return f'"{self.epoch}.catalog.{self.catalog}"'
+
+    def free_cabinets_etag(self, day: date, slot: int) -> str:
+        return f'"{self.epoch}.free.{day}.{slot}.{self.catalog}.{self.days.get(day, 0)}"'
+
+    def occupancy_etag(self, day: date) -> str:
+        return f'"{self.epoch}.occupancy.{day}.{self.catalog}.{self.days.get(day, 0)}"'
+
+    def utilization_etag(self, start: date, end: date) -> str:
+        version = sum(v for day, v in self.days.items() if start <= day <= end)
+        return f'"{self.epoch}.utilization.{start}.{end}.{self.catalog}.{version}"'
+
+    def schedule_etag(self, cabinet_id: UUID, week_start: Optional[date], page: str = "") -> str:
+        """page — курсор и размер страницы истории: у каждой страницы свой ETag"""
+        if week_start is None:
+            return f'"{self.epoch}.schedule.{cabinet_id}.all.{page}.{self.cabinets.get(cabinet_id, 0)}"'
+        version = sum(
+            self.cabinet_days.get((cabinet_id, week_start + timedelta(days=i)), 0)
+            for i in range(7)
+        )
+        return f'"{self.epoch}.schedule.{cabinet_id}.{week_start}.{version}"'
+
+
+versions = VersionClock()
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 без тела, если клиент прислал актуальный ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
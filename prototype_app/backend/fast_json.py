@@ -0,0 +1,41 @@
+"""Быстрая сериализация ответов горячих эндпоинтов.
+
+По умолчанию FastAPI прогоняет ответ через jsonable_encoder и json.dumps,
+обходя каждое значение каждой строки на Python. Здесь строки приходят из
+базы кортежами с известным набором колонок (даты и время уже
+отформатированы в SQL), а в байты их переводит orjson, который сам
+сериализует UUID, date и datetime.
+"""
+from typing import Any, Iterable, Optional, Sequence
+from uuid import UUID
+
+import orjson
+from fastapi import Response
+
+
+# Порядок колонок в SELECT (CABINET_COLUMNS и SCHEDULE_COLUMNS в api.py):
+# строки базы — кортежи, имена полей к ним добавляются только при сериализации
+CABINET_FIELDS = ("id", "number", "floor", "type", "description")
+SCHEDULE_FIELDS = ("pair_id", "date", "start_time", "end_time",
+                   "user_name", "user_role", "user_group", "purpose")
+
+
+def rows_to_dicts(rows: Iterable[Sequence], fields: Sequence[str]) -> list:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def _default(value: Any) -> str:
+    # asyncpg отдаёт свой тип UUID, который orjson не распознаёт
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default)
+
+
+def json_response(body: bytes, etag: Optional[str] = None) -> Response:
+    """Ответ из уже готовых байт, без повторной сериализации"""
+    headers = {"ETag": etag} if etag else None
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,157 @@
+"""Рассылка изменений броней подписчикам через LISTEN/NOTIFY.
+
+Триггер на Pairs_Cabinets (см. /init/) шлёт в канал bookings JSON вида
+{"cabinet_id", "floor", "date", "slot", "state", "user_id"}, где state —
+busy или free. Процесс API держит одно отдельное от пула соединение с
+LISTEN и раскладывает события по очередям подписчиков с учётом фильтра
+по этажу и кабинету. Так события видны и от других процессов (например,
+CLI-импорта), а не только от собственных обработчиков.
+
+Пока соединение с LISTEN разорвано, уведомления теряются. После
+переподключения вызываются resync_hooks (перечитать индекс занятости,
+сбросить версии ETag), а подписчики отключаются, чтобы клиенты
+переподключились и перечитали расписание.
+"""
+import asyncio
+import json
+import logging
+from datetime import date
+from typing import Awaitable, Callable, List, Optional, Set
+from uuid import UUID
+
+import asyncpg
+
+from config import get_db_url
+
+CHANNEL = "bookings"
+# Сколько событий копится у медленного клиента, прежде чем его отключить
+SUBSCRIBER_QUEUE_SIZE = 1000
+RECONNECT_DELAY = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, floor: Optional[int], cabinet_ids: Optional[Set[str]]):
+        self.floor = floor
+        self.cabinet_ids = cabinet_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        if self.floor is not None and event.get("floor") != self.floor:
+            return False
+        if self.cabinet_ids and event.get("cabinet_id") not in self.cabinet_ids:
+            return False
+        return True
+
+
+class BookingBroadcaster:
+    """Один слушатель канала bookings на процесс и раздача событий подписчикам"""
+
+    def __init__(self):
+        self.subscriptions: Set[Subscription] = set()
+        # Обработчики внутри процесса (индекс занятости, версии ETag)
+        self.handlers: List[Callable[[dict], None]] = []
+        # Вызываются после переподключения слушателя
+        self.resync_hooks: List[Callable[[], Awaitable[None]]] = []
+        self.events_total = 0
+        self.dropped_subscribers = 0
+        self.resyncs = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, floor: Optional[int] = None,
+                  cabinet_ids: Optional[List[UUID]] = None) -> Subscription:
+        subscription = Subscription(floor, {str(c) for c in cabinet_ids} if cabinet_ids else None)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+    def publish(self, event: dict):
+        self.events_total += 1
+        for handler in self.handlers:
+            handler(event)
+        for subscription in list(self.subscriptions):
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Клиент не успевает читать: отключаем, он переподключится и перечитает состояние
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+                self.dropped_subscribers += 1
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Некорректное событие в канале %s: %r", channel, payload)
+            return
+        self.publish(event)
+
+    async def _resync(self):
+        self.resyncs += 1
+        for hook in self.resync_hooks:
+            try:
+                await hook()
+            except Exception:
+                logger.exception("Не удалось перечитать состояние после переподключения %s", CHANNEL)
+        for subscription in list(self.subscriptions):
+            subscription.overflowed = True
+            self.unsubscribe(subscription)
+
+    async def _listen_forever(self):
+        dsn = get_db_url().replace("+asyncpg", "")
+        listened = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda conn: closed.set())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                if listened:
+                    # События, пришедшие без слушателя, потеряны
+                    await self._resync()
+                listened = True
+                await closed.wait()
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("Слушатель %s отключён: %s", CHANNEL, e)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "listening": self._task is not None and not self._task.done(),
+            "subscribers": len(self.subscriptions),
+            "events_total": self.events_total,
+            "dropped_subscribers": self.dropped_subscribers,
+            "resyncs": self.resyncs,
+        }
+
+
+def event_date(event: dict) -> date:
+    return date.fromisoformat(event["date"])
+
+
+broadcaster = BookingBroadcaster()
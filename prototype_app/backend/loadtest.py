@@ -0,0 +1,364 @@
+"""Нагрузочный тест API бронирования.
+
+Поднимает одноразовый Postgres, запускает api.py через uvicorn, создаёт
+схему (/init/), засевает данные и гоняет смешанную нагрузку с заданной
+конкурентностью:
+    free     — свободные кабинеты на дату и пару (GET /cabinets/?date&pair)
+    schedule — недельное расписание кабинета (GET /cabinets/{id}/schedule)
+    login    — вход (POST /users/login)
+    book     — бронирование одного и того же кабинета на одну пару
+               пользователями разных приоритетов (POST /pairs_cabinets/)
+
+Результат — JSON с p50/p95/p99, RPS, кодами ответов и числом запросов к
+базе (заголовок X-DB-Queries) по каждому сценарию; его удобно сохранять
+и сравнивать между коммитами.
+
+Откуда берётся Postgres (--postgres):
+    docker   — контейнер из того же образа, что в docker-compose.yml
+    initdb   — временный кластер через initdb/pg_ctl (--pg-bin, если не в PATH)
+    existing — сервер из настроек DB_*, в нём создаётся и потом удаляется
+               отдельная база
+
+Пример:
+    python loadtest.py --postgres initdb --concurrency 32 --duration 30 \\
+        --mix free=40,schedule=30,login=20,book=10 --output result.json
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List
+
+import asyncpg
+import httpx
+
+from config import settings
+from occupancy import PAIR_TIMES
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DOCKER_IMAGE = "postgres:latest"
+PRIORITIES = ("prostoi-smertni", "union", "prepod", "dispetcher")
+PASSWORD = "bench"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def wait_for_postgres(dsn: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            conn = await asyncpg.connect(dsn)
+            await conn.close()
+            return
+        except (OSError, asyncpg.PostgresError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+class ThrowawayPostgres:
+    """Одноразовый сервер или база; stop() убирает всё, что создал start()"""
+
+    def __init__(self, mode: str, pg_bin: str = ""):
+        self.mode = mode
+        self.pg_bin = pg_bin
+        self.host, self.port = "127.0.0.1", free_port()
+        self.user, self.password, self.database = "postgres", "postgres", "fast_api"
+        self._container = None
+        self._datadir = None
+
+    def _bin(self, name: str) -> str:
+        return os.path.join(self.pg_bin, name) if self.pg_bin else name
+
+    @property
+    def dsn(self) -> str:
+        return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
+
+    def env(self) -> dict:
+        return {
+            "DB_HOST": self.host, "DB_PORT": str(self.port), "DB_NAME": self.database,
+            "DB_USER": self.user, "DB_PASSWORD": self.password,
+        }
+
+    async def start(self):
+        if self.mode == "docker":
+            self._container = subprocess.check_output([
+                "docker", "run", "-d", "--rm",
+                "-e", f"POSTGRES_PASSWORD={self.password}",
+                "-e", f"POSTGRES_DB={self.database}",
+                "-p", f"{self.port}:5432", DOCKER_IMAGE,
+            ], text=True).strip()
+        elif self.mode == "initdb":
+            self._datadir = tempfile.mkdtemp(prefix="bronka_pg_")
+            subprocess.run([self._bin("initdb"), "-D", self._datadir, "-U", self.user,
+                            "--auth=trust", "-E", "UTF8"], check=True, stdout=subprocess.DEVNULL)
+            subprocess.run([self._bin("pg_ctl"), "-D", self._datadir, "-w",
+                            "-l", os.path.join(self._datadir, "server.log"),
+                            "-o", f"-p {self.port} -k {self._datadir} -c max_connections=200",
+                            "start"], check=True, stdout=subprocess.DEVNULL)
+            await wait_for_postgres(self.dsn.replace(f"/{self.database}", "/postgres"))
+            conn = await asyncpg.connect(self.dsn.replace(f"/{self.database}", "/postgres"))
+            await conn.execute(f"CREATE DATABASE {self.database}")
+            await conn.close()
+        else:
+            self.host, self.port = settings.DB_HOST, settings.DB_PORT
+            self.user, self.password = settings.DB_USER, settings.DB_PASSWORD
+            self.database = f"{settings.DB_NAME}_bench_{os.getpid()}"
+            conn = await asyncpg.connect(self.dsn.replace(f"/{self.database}", "/postgres"))
+            await conn.execute(f"CREATE DATABASE {self.database}")
+            await conn.close()
+        await wait_for_postgres(self.dsn)
+
+    async def stop(self):
+        if self._container:
+            subprocess.run(["docker", "stop", self._container], stdout=subprocess.DEVNULL)
+        elif self._datadir:
+            subprocess.run([self._bin("pg_ctl"), "-D", self._datadir, "-m", "fast", "stop"],
+                           stdout=subprocess.DEVNULL)
+            shutil.rmtree(self._datadir, ignore_errors=True)
+        elif self.mode == "existing":
+            conn = await asyncpg.connect(self.dsn.replace(f"/{self.database}", "/postgres"))
+            await conn.execute(f"DROP DATABASE IF EXISTS {self.database} WITH (FORCE)")
+            await conn.close()
+
+
+def start_app(port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **env},
+    )
+
+
+async def wait_for_app(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/pool/stats")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("API не поднялся")
+        await asyncio.sleep(0.3)
+
+
+async def seed(client: httpx.AsyncClient, rng: random.Random, args, week_start: date) -> dict:
+    """Кабинеты и пользователи через API, расписание недели — через /pairs/import"""
+    (await client.post("/init/")).raise_for_status()
+
+    floors = max(1, args.cabinets // 40)
+    for i in range(args.cabinets):
+        floor = i % floors + 1
+        (await client.post("/cabinets/", json={
+            "number": floor * 1000 + i, "floor": floor,
+            "type": rng.choice(("lecture", "lab", "seminar", "computer")),
+            "description": f"bench {i}",
+        })).raise_for_status()
+    cabinets = (await client.get("/cabinets/")).json()
+
+    usernames = []
+    for i in range(args.users):
+        username = f"bench{i}"
+        (await client.post("/users/", json={
+            "name": f"Bench User {i}", "username": username, "password": PASSWORD,
+            "priority": PRIORITIES[i % len(PRIORITIES)], "group": f"g{i % 50}",
+        })).raise_for_status()
+        usernames.append(username)
+    # Импорт расписания доступен только диспетчеру
+    (await client.post("/users/", json={
+        "name": "Bench Dispatcher", "username": "bench-dispatcher", "password": PASSWORD,
+        "priority": "dispetcher", "group": "g0",
+    })).raise_for_status()
+    dispatcher = (await client.post("/users/login", json={
+        "username": "bench-dispatcher", "password": PASSWORD})).json()
+
+    rows = []
+    days = [week_start + timedelta(days=d) for d in range(6)]
+    # Первый кабинет остаётся свободным: на нём идёт конкурентное бронирование
+    for cabinet in cabinets[1:]:
+        for day in days:
+            for slot in PAIR_TIMES:
+                if rng.random() < args.occupancy:
+                    rows.append({"date": day.isoformat(), "pair": slot, "cabinet": cabinet["number"],
+                                 "username": rng.choice(usernames), "purpose": "занятие"})
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["date", "pair", "cabinet", "username", "purpose"])
+    writer.writeheader()
+    writer.writerows(rows)
+    report = (await client.post("/pairs/import", content=buffer.getvalue().encode(),
+                                headers={"Content-Type": "text/csv",
+                                         "Authorization": f"Bearer {dispatcher['token']}"})).json()
+    return {"cabinets": cabinets, "usernames": usernames, "days": days,
+            "bookings": report["imported"]}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.queries: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, scenario: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[scenario] += 1
+            return None
+        self.latencies[scenario].append((time.perf_counter() - started) * 1000)
+        self.statuses[scenario][response.status_code] += 1
+        self.queries[scenario] += int(response.headers.get("x-db-queries", 0))
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        scenarios = {}
+        for name, values in sorted(self.latencies.items()):
+            values.sort()
+            scenarios[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "statuses": {str(code): n for code, n in sorted(self.statuses[name].items())},
+                "rps": round(len(values) / elapsed, 1),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "db_queries_total": self.queries[name],
+                "db_queries_per_request": round(self.queries[name] / len(values), 2),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {"elapsed_s": round(elapsed, 2), "requests": total,
+                "rps": round(total / elapsed, 1), "scenarios": scenarios}
+
+
+async def run_workload(client: httpx.AsyncClient, data: dict, args, rng: random.Random) -> dict:
+    mix = {name: float(weight) for name, weight in
+           (item.split("=") for item in args.mix.split(","))}
+    names, weights = list(mix), list(mix.values())
+
+    # Все бронирования бьют в один кабинет и одну пару — самый конкурентный случай
+    hot_day = data["days"][0]
+    hot_cabinet = data["cabinets"][0]
+    start, end = PAIR_TIMES[1]
+    hot_pair = (await client.post("/pairs/", json={
+        "date": hot_day.isoformat(), "start_time": start, "end_time": end})).json()
+    tokens = []
+    for username in data["usernames"][:max(4, args.concurrency)]:
+        login = (await client.post("/users/login",
+                                   json={"username": username, "password": PASSWORD})).json()
+        tokens.append(login["token"])
+
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+
+    async def worker(worker_rng: random.Random):
+        while time.monotonic() < deadline:
+            scenario = worker_rng.choices(names, weights)[0]
+            if scenario == "free":
+                await recorder.call(client, scenario, "GET", "/cabinets/", params={
+                    "date": worker_rng.choice(data["days"]).isoformat(),
+                    "pair": worker_rng.choice(list(PAIR_TIMES))})
+            elif scenario == "schedule":
+                cabinet = worker_rng.choice(data["cabinets"])
+                await recorder.call(client, scenario, "GET", f"/cabinets/{cabinet['id']}/schedule",
+                                    params={"date": worker_rng.choice(data["days"]).isoformat()})
+            elif scenario == "login":
+                await recorder.call(client, scenario, "POST", "/users/login", json={
+                    "username": worker_rng.choice(data["usernames"]), "password": PASSWORD})
+            elif scenario == "book":
+                await recorder.call(client, scenario, "POST", "/pairs_cabinets/", json={
+                    "pair_id": hot_pair["id"], "cabinet_id": hot_cabinet["id"], "purpose": "bench"},
+                    headers={"Authorization": f"Bearer {worker_rng.choice(tokens)}"})
+            else:
+                raise ValueError(f"неизвестный сценарий {scenario}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(random.Random(rng.random())) for _ in range(args.concurrency)))
+    return recorder.report(time.perf_counter() - started)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    postgres = ThrowawayPostgres(args.postgres, args.pg_bin)
+    await postgres.start()
+    app_port = free_port()
+    app = start_app(app_port, postgres.env())
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}",
+                                     limits=limits, timeout=30.0) as client:
+            await wait_for_app(client)
+            today = date.today()
+            data = await seed(client, rng, args, today - timedelta(days=today.weekday()))
+            result = await run_workload(client, data, args, rng)
+            result["pool"] = (await client.get("/pool/stats")).json()
+    finally:
+        app.terminate()
+        app.wait()
+        await postgres.stop()
+
+    result = {
+        "revision": git_revision(),
+        "config": {
+            "postgres": args.postgres, "concurrency": args.concurrency, "duration_s": args.duration,
+            "mix": args.mix, "seed": args.seed, "cabinets": args.cabinets, "users": args.users,
+            "seeded_bookings": data["bookings"],
+        },
+        **result,
+    }
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--postgres", choices=("docker", "initdb", "existing"), default="docker")
+    parser.add_argument("--pg-bin", default="", help="каталог с initdb/pg_ctl")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="секунд нагрузки")
+    parser.add_argument("--mix", default="free=40,schedule=30,login=20,book=10")
+    parser.add_argument("--cabinets", type=int, default=120)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--occupancy", type=float, default=0.4, help="доля занятых пар при засеве")
+    parser.add_argument("--seed", type=int, default=63)
+    parser.add_argument("--output", default="", help="куда сохранить JSON с результатом")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
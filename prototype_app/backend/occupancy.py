@@ -0,0 +1,122 @@
+from datetime import date, time, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+# Расписание пар: номер -> (начало, конец)
+PAIR_TIMES = {
+    1: ('08:00', '09:35'),
+    2: ('09:45', '11:20'),
+    3: ('11:30', '13:05'),
+    4: ('13:30', '15:05'),
+    5: ('15:15', '16:50'),
+    6: ('17:00', '18:35'),
+    7: ('18:45', '20:20'),
+    8: ('20:30', '22:05')
+}
+
+# (начало, конец) -> номер пары, для разбора времени из запросов
+SLOT_BY_TIMES = {
+    (time.fromisoformat(start), time.fromisoformat(end)): slot
+    for slot, (start, end) in PAIR_TIMES.items()
+}
+
+# CTE с тем же расписанием, чтобы номер пары считался прямо в SQL
+SLOTS_CTE = "slots(slot, start_time, end_time) AS (VALUES {})".format(", ".join(
+    f"({slot}, '{start}'::time, '{end}'::time)" for slot, (start, end) in PAIR_TIMES.items()
+))
+
+
+def slot_bit(slot: int) -> int:
+    """Пара N занимает бит N-1: восемь пар кабинета за день — один байт"""
+    return 1 << (slot - 1)
+
+
+class OccupancyIndex:
+    """Занятость кабинетов в памяти процесса: (дата, кабинет) -> битовая маска пар.
+
+    Прогревается при старте на окно дат, дальше обновляется по месту при
+    бронировании. Вне окна вызывающий код идёт в базу. Индекс у каждого
+    процесса свой, поэтому API рассчитан на запуск одним воркером uvicorn.
+    """
+
+    def __init__(self):
+        self.window_start: Optional[date] = None
+        self.window_end: Optional[date] = None
+        self.cabinets: List[dict] = []
+        self.by_number: Dict[int, dict] = {}
+        self.masks: Dict[Tuple[date, UUID], int] = {}
+
+    def covers(self, day: date) -> bool:
+        return self.window_start is not None and self.window_start <= day <= self.window_end
+
+    async def warm(self, session, start: date, end: date):
+        """Загружает кабинеты и брони за [start, end] двумя запросами"""
+        try:
+            result = await session.execute(text("SELECT * FROM Cabinets ORDER BY number;"))
+        except ProgrammingError:
+            # Таблиц ещё нет (/init/ не вызывался) — индекс остаётся выключенным
+            self.window_start = self.window_end = None
+            return
+        cabinets = [dict(row) for row in result.mappings()]
+
+        result = await session.execute(text("""
+            SELECT cabinet_id, date, mask
+            FROM Cabinet_Day_Occupancy
+            WHERE date BETWEEN :start AND :end
+        """), {"start": start, "end": end})
+
+        masks = {(day, cabinet_id): mask for cabinet_id, day, mask in result}
+
+        self.cabinets = cabinets
+        self.by_number = {c['number']: c for c in cabinets}
+        self.masks = masks
+        self.window_start = start
+        self.window_end = end
+
+    async def warm_around(self, session, today: date, days_back: int, days_ahead: int):
+        await self.warm(session, today - timedelta(days=days_back), today + timedelta(days=days_ahead))
+
+    def free_cabinets(self, day: date, slot: int) -> List[dict]:
+        """Свободные в пару slot кабинеты, в порядке номеров"""
+        bit = slot_bit(slot)
+        masks = self.masks
+        return [c for c in self.cabinets if not masks.get((day, c['id']), 0) & bit]
+
+    def is_free(self, day: date, cabinet_id: UUID, slot: int) -> bool:
+        return not self.masks.get((day, cabinet_id), 0) & slot_bit(slot)
+
+    def grid(self, days: List[date], floor: Optional[int] = None,
+             cabinet_type: Optional[str] = None) -> Tuple[List[dict], List[List[int]]]:
+        """Кабинеты с фильтром и маски занятости по каждому дню из days"""
+        cabinets = [
+            c for c in self.cabinets
+            if (floor is None or c['floor'] == floor)
+            and (cabinet_type is None or c['type'] == cabinet_type)
+        ]
+        masks = self.masks
+        return cabinets, [[masks.get((day, c['id']), 0) for day in days] for c in cabinets]
+
+    def mark_busy(self, day: date, cabinet_id: UUID, slot: int):
+        if not self.covers(day):
+            return
+        key = (day, cabinet_id)
+        self.masks[key] = self.masks.get(key, 0) | slot_bit(slot)
+
+    def mark_free(self, day: date, cabinet_id: UUID, slot: int):
+        if not self.covers(day):
+            return
+        key = (day, cabinet_id)
+        self.masks[key] = self.masks.get(key, 0) & ~slot_bit(slot)
+
+    def add_cabinet(self, cabinet: dict):
+        if self.window_start is None:
+            return
+        self.cabinets.append(cabinet)
+        self.cabinets.sort(key=lambda c: c['number'])
+        self.by_number[cabinet['number']] = cabinet
+
+
+occupancy = OccupancyIndex()
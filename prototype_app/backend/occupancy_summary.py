@@ -0,0 +1,116 @@
+"""Сводка занятости по дням и её сверка.
+
+Cabinet_Day_Occupancy хранит на каждый занятый (дата, кабинет) битовую
+маску пар и число броней. Таблицу ведут триггеры на Pairs_Cabinets и
+Pairs (см. /init/), поэтому чтение занятости за период — один проход по
+первичному ключу вместо соединения броней с парами.
+
+Массовые загрузки в обход триггеров (datagen.py), смена даты или номера
+уже существующей пары и ручные правки могут рассинхронизировать сводку.
+Сверка пересчитывает её из броней за период и сравнивает со
+сохранённой; --fix перестраивает период заново.
+
+Запуск (для cron: код выхода 1, если расхождения остались):
+    python occupancy_summary.py --start 2026-09-01 --end 2026-12-31
+    python occupancy_summary.py --fix
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date
+from typing import Optional
+
+# Сводка, посчитанная заново из броней
+EXPECTED_SQL = """
+    SELECT pc.date, pc.cabinet_id,
+           bit_or(1 << (p.slot - 1))::smallint AS mask,
+           count(*)::smallint AS booked
+    FROM Pairs_Cabinets pc
+    JOIN Pairs p ON p.id = pc.pair_id AND p.date = pc.date
+    WHERE ($1::date IS NULL OR (pc.date >= $1 AND p.date >= $1))
+    AND ($2::date IS NULL OR (pc.date <= $2 AND p.date <= $2))
+    GROUP BY pc.date, pc.cabinet_id
+"""
+
+PERIOD_FILTER = """
+    WHERE ($1::date IS NULL OR date >= $1)
+    AND ($2::date IS NULL OR date <= $2)
+"""
+
+STORED_SQL = "SELECT date, cabinet_id, mask, booked FROM Cabinet_Day_Occupancy" + PERIOD_FILTER
+
+# Сколько расхождений показывать в отчёте
+DRIFT_SAMPLE = 20
+
+
+async def find_drift(conn, start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """Расхождения сводки с бронями за [start, end] (None — без границы)"""
+    rows = await conn.fetch(f"""
+        WITH expected AS ({EXPECTED_SQL}), stored AS ({STORED_SQL})
+        SELECT coalesce(e.date, s.date) AS date,
+               coalesce(e.cabinet_id, s.cabinet_id) AS cabinet_id,
+               e.mask AS expected_mask, s.mask AS stored_mask,
+               e.booked AS expected_booked, s.booked AS stored_booked
+        FROM expected e
+        FULL JOIN stored s ON s.date = e.date AND s.cabinet_id = e.cabinet_id
+        WHERE e.mask IS DISTINCT FROM s.mask OR e.booked IS DISTINCT FROM s.booked
+        ORDER BY 1, 2
+    """, start, end)
+    return {
+        "drifted": len(rows),
+        "sample": [
+            {key: str(value) if key in ("date", "cabinet_id") else value
+             for key, value in row.items()}
+            for row in rows[:DRIFT_SAMPLE]
+        ],
+    }
+
+
+async def rebuild(conn, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Пересчитывает сводку за [start, end]; брони на время пересчёта
+    блокируются от записи (чтение продолжается)"""
+    async with conn.transaction():
+        await conn.execute("LOCK TABLE Pairs_Cabinets IN SHARE MODE")
+        await conn.execute("DELETE FROM Cabinet_Day_Occupancy" + PERIOD_FILTER, start, end)
+        status = await conn.execute(
+            f"INSERT INTO Cabinet_Day_Occupancy (date, cabinet_id, mask, booked) {EXPECTED_SQL}",
+            start, end)
+    return int(status.split()[-1])
+
+
+async def reconcile(conn, start: Optional[date] = None, end: Optional[date] = None,
+                    fix: bool = False) -> dict:
+    report = await find_drift(conn, start, end)
+    if fix and report["drifted"]:
+        report["rebuilt_rows"] = await rebuild(conn, start, end)
+        report["drifted_after"] = (await find_drift(conn, start, end))["drifted"]
+    return report
+
+
+async def main(args) -> int:
+    import asyncpg
+    from config import get_db_url
+
+    start = date.fromisoformat(args.start) if args.start else None
+    end = date.fromisoformat(args.end) if args.end else None
+    conn = await asyncpg.connect(args.dsn or get_db_url().replace("+asyncpg", ""))
+    try:
+        report = await reconcile(conn, start, end, args.fix)
+    finally:
+        await conn.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if report.get("drifted_after", report["drifted"]) else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", default="", help="первый день периода (по умолчанию без границы)")
+    parser.add_argument("--end", default="", help="последний день периода")
+    parser.add_argument("--fix", action="store_true", help="перестроить сводку, если есть расхождения")
+    parser.add_argument("--dsn", default="", help="по умолчанию из настроек DB_*")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
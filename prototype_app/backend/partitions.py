@@ -0,0 +1,62 @@
+"""Секции Pairs и Pairs_Cabinets по семестрам.
+
+Обе таблицы секционированы по date с одинаковыми границами: весенний
+семестр — [1 февраля, 1 августа), осенний — [1 августа, 1 февраля
+следующего года), так что сессия остаётся в своём семестре. Секции
+называются pairs_2025_autumn / pairs_cabinets_2025_autumn. Запросы с
+фильтром по date (в том числе по pc.date) затрагивают только нужные
+секции, а законченные семестры целиком отсоединяет archive.py.
+
+Секция DEFAULT ловит строки вне созданных семестров; чтобы она
+оставалась пустой, все пути записи сначала вызывают ensure_partitions.
+"""
+from datetime import date
+from typing import Iterator, List, Set, Tuple
+
+PARTITIONED_TABLES = ("pairs", "pairs_cabinets")
+
+Semester = Tuple[str, date, date]
+
+
+def semester_of(day: date) -> Semester:
+    """(суффикс имени, начало включительно, конец не включительно)"""
+    if date(day.year, 2, 1) <= day < date(day.year, 8, 1):
+        return f"{day.year}_spring", date(day.year, 2, 1), date(day.year, 8, 1)
+    year = day.year if day.month >= 8 else day.year - 1
+    return f"{year}_autumn", date(year, 8, 1), date(year + 1, 2, 1)
+
+
+def semesters_between(start: date, end: date) -> Iterator[Semester]:
+    semester = semester_of(start)
+    while semester[1] <= end:
+        yield semester
+        semester = semester_of(semester[2])
+
+
+def partition_ddl(semester: Semester) -> List[str]:
+    suffix, start, end = semester
+    return [
+        f"CREATE TABLE IF NOT EXISTS {table}_{suffix} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        for table in PARTITIONED_TABLES
+    ]
+
+
+# Семестры, секции которых этот процесс уже создал или видел
+_known: Set[str] = set()
+
+
+async def ensure_partitions(execute, start: date, end: date):
+    """Создаёт недостающие секции на [start, end]; execute(sql) — корутина
+    выполнения DDL (asyncpg conn.execute или обёртка над сессией)"""
+    for semester in semesters_between(start, end):
+        if semester[0] in _known:
+            continue
+        for statement in partition_ddl(semester):
+            await execute(statement)
+        _known.add(semester[0])
+
+
+def forget_partitions():
+    """После пересоздания схемы или архивации кэш известных секций неверен"""
+    _known.clear()
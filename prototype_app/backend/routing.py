@@ -0,0 +1,126 @@
+"""Маршруты по карте корпуса (frontend_map) на стороне сервера.
+
+Граф вершин и рёбер читается один раз из frontend_map/src/store/graphData.ts,
+вес ребра — евклидова длина, как в algorithms/dijkstra.ts. При загрузке
+Флойдом — Уоршеллом на NumPy считаются матрица расстояний (float32) и
+матрица следующего шага (int16/int32, -1 — пути нет). Маршрут после этого
+восстанавливается проходом по next_hop за длину пути, без поиска.
+
+Для вершин-объектов (objectName задан, у кабинетов это номер) каждая
+строка матрицы расстояний заранее отсортирована: nearest_objects(v)
+отдаёт объекты по возрастанию расстояния от v, и поиск ближайшего
+подходящего останавливается на первых k совпадениях.
+"""
+import hashlib
+import logging
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_VERTEX = re.compile(
+    r'\{\s*id:\s*"([^"]+)",\s*objectName:\s*(?:null|"([^"]*)"),\s*cx:\s*([-\d.]+),\s*cy:\s*([-\d.]+)\s*,?\s*\}')
+_EDGE = re.compile(r'\{\s*id:\s*"[^"]+",\s*from:\s*"([^"]+)",\s*to:\s*"([^"]+)"\s*,?\s*\}')
+
+
+class Route(NamedTuple):
+    vertices: List[str]
+    length: float
+    path: str  # SVG-путь "M x y L x y ...", как строит navigationHelper.ts
+
+
+class RoutingTable:
+    def __init__(self, ids: List[str], names: List[Optional[str]], coords: np.ndarray,
+                 edges: List[tuple], version: str = ""):
+        self.ids = ids
+        self.version = version  # хэш исходного файла графа, входит в ETag маршрутов
+        self.names = names
+        self.coords = coords
+        self.index: Dict[str, int] = {vertex_id: i for i, vertex_id in enumerate(ids)}
+        # objectName -> вершина: фронтенд прокладывает маршрут к объекту по имени
+        self.by_name: Dict[str, int] = {name: i for i, name in enumerate(names) if name}
+        self.distances, self.next_hop = self._all_pairs(edges)
+        self.objects = np.array(sorted(self.by_name.values()), dtype=np.int32)
+        # objects_order[v] — индексы в objects по возрастанию расстояния от v
+        self.objects_order = np.argsort(self.distances[:, self.objects], axis=1,
+                                        kind="stable").astype(self.next_hop.dtype)
+
+    @classmethod
+    def from_graph_file(cls, path: str) -> "RoutingTable":
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        vertices = _VERTEX.findall(source)
+        ids = [v[0] for v in vertices]
+        names = [v[1] or None for v in vertices]
+        coords = np.array([(float(v[2]), float(v[3])) for v in vertices], dtype=np.float64)
+        index = {vertex_id: i for i, vertex_id in enumerate(ids)}
+        # Рёбра с неизвестными вершинами пропускаются, как в dijkstra.ts
+        edges = [(index[a], index[b]) for a, b in _EDGE.findall(source) if a in index and b in index]
+        return cls(ids, names, coords, edges, hashlib.sha1(source.encode()).hexdigest()[:12])
+
+    def _all_pairs(self, edges: List[tuple]):
+        n = len(self.ids)
+        dist = np.full((n, n), np.inf)
+        np.fill_diagonal(dist, 0.0)
+        hop_type = np.int16 if n < np.iinfo(np.int16).max else np.int32
+        next_hop = np.full((n, n), -1, dtype=hop_type)
+        next_hop[np.arange(n), np.arange(n)] = np.arange(n)
+        if edges:
+            a, b = np.array(edges).T
+            length = np.hypot(*(self.coords[a] - self.coords[b]).T)
+            for u, v in ((a, b), (b, a)):
+                shorter = length < dist[u, v]
+                dist[u[shorter], v[shorter]] = length[shorter]
+                next_hop[u[shorter], v[shorter]] = v[shorter]
+
+        for k in range(n):
+            through = dist[:, k, None] + dist[None, k, :]
+            better = through < dist
+            dist = np.where(better, through, dist)
+            next_hop = np.where(better, next_hop[:, k, None], next_hop).astype(hop_type)
+        return dist.astype(np.float32), next_hop
+
+    def resolve(self, vertex: str) -> Optional[int]:
+        """Вершина по id (v12) или по имени объекта на карте"""
+        found = self.index.get(vertex)
+        return found if found is not None else self.by_name.get(vertex)
+
+    def route(self, start: int, finish: int) -> Optional[Route]:
+        if self.next_hop[start, finish] < 0:
+            return None
+        path = [start]
+        while path[-1] != finish:
+            path.append(int(self.next_hop[path[-1], finish]))
+        points = self.coords[path]
+        svg = " ".join(f"{'M' if i == 0 else 'L'}{round(float(x), 3)!r} {round(float(y), 3)!r}"
+                       for i, (x, y) in enumerate(points))
+        return Route([self.ids[i] for i in path], round(float(self.distances[start, finish]), 3), svg)
+
+    def nearest_objects(self, source: int) -> Iterator[Tuple[str, float]]:
+        """(objectName, расстояние) по возрастанию расстояния; недостижимые не отдаются"""
+        distances = self.distances[source]
+        for position in self.objects_order[source]:
+            vertex = self.objects[position]
+            distance = float(distances[vertex])
+            if distance == np.inf:
+                return
+            yield self.names[vertex], round(distance, 3)
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "vertices": len(self.ids),
+            "reachable_pairs": int(np.isfinite(self.distances).sum()),
+            "objects": len(self.objects),
+            "matrix_bytes": int(self.distances.nbytes + self.next_hop.nbytes + self.objects_order.nbytes),
+        }
+
+
+def load_routing_table(path: str) -> Optional[RoutingTable]:
+    try:
+        return RoutingTable.from_graph_file(path)
+    except FileNotFoundError:
+        logger.warning("Граф карты %s не найден, /route выключен", path)
+        return None
@@ -0,0 +1,71 @@
+"""Поиск окон из нескольких свободных пар подряд.
+
+Маски занятости (как у /cabinets/availability) разворачиваются в массив
+NumPy busy[кабинет, день, пара]; окна нужной длины ищутся скользящей
+суммой по оси пар сразу для всех кабинетов и дней, без циклов по ним.
+"""
+from typing import List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from occupancy import PAIR_TIMES
+
+SLOTS = len(PAIR_TIMES)
+
+
+class SlotOption(NamedTuple):
+    cabinet: int      # индекс кабинета в исходном списке
+    day: int          # индекс дня
+    first_slot: int   # номер первой пары окна (с 1)
+    free_run: int     # длина всего свободного промежутка, в который попало окно
+
+
+def busy_matrix(masks: Sequence[Sequence[int]], days: int) -> np.ndarray:
+    """Маски [кабинет][день] -> bool-массив (кабинеты, дни, SLOTS)"""
+    masks = np.asarray(masks, dtype=np.uint8).reshape(len(masks), days)
+    return ((masks[..., None] >> np.arange(SLOTS, dtype=np.uint8)) & 1).astype(bool)
+
+
+def run_lengths(free: np.ndarray):
+    """Для каждой пары: сколько свободных подряд заканчивается на ней и начинается с неё"""
+    left = np.zeros(free.shape, dtype=np.int8)
+    right = np.zeros(free.shape, dtype=np.int8)
+    left[..., 0] = free[..., 0]
+    for s in range(1, SLOTS):
+        left[..., s] = (left[..., s - 1] + 1) * free[..., s]
+    right[..., -1] = free[..., -1]
+    for s in range(SLOTS - 2, -1, -1):
+        right[..., s] = (right[..., s + 1] + 1) * free[..., s]
+    return left, right
+
+
+def find_free_runs(busy: np.ndarray, length: int, slot_from: int = 1,
+                   slot_to: int = SLOTS, limit: int = 50) -> Tuple[List[SlotOption], int]:
+    """Первые limit окон из length свободных пар внутри [slot_from, slot_to]
+    и общее число найденных окон.
+
+    Порядок: раньше день, раньше первая пара, затем окно в более коротком
+    свободном промежутке — длинные промежутки остаются для длинных броней.
+    """
+    free = ~busy
+    # Свободные пары до префиксной суммы: окно [s, s + length) свободно,
+    # если сумма в нём равна length
+    counts = np.concatenate(
+        [np.zeros(free.shape[:-1] + (1,), dtype=np.int16), np.cumsum(free, axis=-1, dtype=np.int16)],
+        axis=-1,
+    )
+    starts = np.arange(slot_from - 1, slot_to - length + 1)
+    if starts.size == 0 or free.size == 0:
+        return [], 0
+    fits = (counts[..., starts + length] - counts[..., starts]) == length
+
+    left, right = run_lengths(free)
+    free_run = left[..., starts] + right[..., starts + length - 1] + length - 2
+
+    cabinet_idx, day_idx, start_idx = np.nonzero(fits)
+    runs = free_run[cabinet_idx, day_idx, start_idx]
+    order = np.lexsort((cabinet_idx, runs, start_idx, day_idx))[:limit]
+    return [
+        SlotOption(int(cabinet_idx[i]), int(day_idx[i]), int(starts[start_idx[i]]) + 1, int(runs[i]))
+        for i in order
+    ], len(cabinet_idx)
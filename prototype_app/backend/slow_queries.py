@@ -0,0 +1,125 @@
+"""Журнал медленных запросов с выборочным EXPLAIN.
+
+Каждый SQL дольше SLOW_QUERY_MS попадает в лог (logging), в кольцевой
+буфер последних записей (GET /slow_queries) и, если задан
+SLOW_QUERY_LOG_FILE, строкой JSON в файл. В записи — нормализованный
+текст, параметры с замазанными паролями, длительность и маршрут.
+
+С вероятностью SLOW_QUERY_EXPLAIN_RATE для медленного SELECT в фоне
+снимается EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) на отдельном
+соединении; план сохраняется в той же записи. Запросы с INSERT/UPDATE/
+DELETE не объясняются: ANALYZE выполнил бы их повторно. Одновременно
+снимается не больше одного плана, чтобы не добивать и так медленную базу.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import deque
+from typing import Optional, Sequence
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = 200
+REDACTED = "***"
+
+_COMMENT = re.compile(r"--[^\n]*")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+_WRITES = re.compile(r"\b(insert|update|delete|merge)\b", re.IGNORECASE)
+
+
+def normalize_sql(statement: str) -> str:
+    """Одна строка без комментариев, литералы заменены на ?"""
+    statement = _COMMENT.sub(" ", statement)
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def redact_params(names: Optional[Sequence[str]], parameters) -> dict:
+    """Параметры по именам; всё, где в имени есть password, замазывается"""
+    if isinstance(parameters, dict):
+        items = parameters.items()
+    else:
+        parameters = tuple(parameters or ())
+        names = names or [f"${i}" for i in range(1, len(parameters) + 1)]
+        items = zip(names, parameters)
+    return {
+        name: REDACTED if "password" in name.lower() else
+        value if isinstance(value, (int, float, bool, type(None))) else str(value)
+        for name, value in items
+    }
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float, explain_rate: float, log_file: str = ""):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.log_file = log_file
+        self.entries: deque = deque(maxlen=MAX_ENTRIES)
+        self.total = 0
+        self._explaining = False
+
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def record(self, statement: str, parameters, names: Optional[Sequence[str]],
+               duration: float, route: Optional[str], explain_with=None):
+        """Вызывается из события after_cursor_execute для запросов дольше порога"""
+        self.total += 1
+        entry = {
+            "at": time.time(),
+            "duration_ms": round(duration * 1000, 2),
+            "route": route or "background",
+            "sql": normalize_sql(statement),
+            "params": redact_params(names, parameters),
+            "plan": None,
+        }
+        self.entries.append(entry)
+        logger.warning("Медленный запрос %.1f мс [%s]: %s %s", entry["duration_ms"],
+                       entry["route"], entry["sql"], entry["params"])
+
+        if (explain_with is not None and not self._explaining
+                and random.random() < self.explain_rate
+                and not _WRITES.search(entry["sql"])):
+            self._explaining = True
+            asyncio.get_running_loop().create_task(
+                self._capture_plan(entry, statement, parameters, explain_with))
+        else:
+            self._write(entry)
+
+    async def _capture_plan(self, entry: dict, statement: str, parameters, explain_with):
+        try:
+            plan = await explain_with(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement,
+                tuple(parameters.values()) if isinstance(parameters, dict) else tuple(parameters or ()))
+            entry["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+        except Exception as e:
+            entry["plan_error"] = str(e)
+        finally:
+            self._explaining = False
+            self._write(entry)
+
+    def _write(self, entry: dict):
+        if not self.log_file:
+            return
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain_rate": self.explain_rate,
+            "total": self.total,
+            "entries": list(self.entries),
+        }
+
+
+slow_log = SlowQueryLog(settings.SLOW_QUERY_MS, settings.SLOW_QUERY_EXPLAIN_RATE,
+                        settings.SLOW_QUERY_LOG_FILE)
@@ -0,0 +1,188 @@
+"""Массовая загрузка расписания в Pairs/Pairs_Cabinets.
+
+Строки расписания (date, pair, cabinet, username, purpose) копируются во
+временную таблицу через COPY FROM STDIN, а затем одной транзакцией
+разрешаются в кабинеты/пользователей и применяются с теми же правилами
+приоритета, что и POST /pairs_cabinets/.
+
+Запуск из командной строки:
+    python timetable_import.py timetable.csv
+"""
+import asyncio
+import csv
+import io
+import json
+import sys
+from datetime import date
+from typing import Iterable, List, Tuple
+
+from occupancy import PAIR_TIMES, SLOTS_CTE
+from partitions import ensure_partitions
+
+STAGING_COLUMNS = ("row_no", "date", "slot", "cabinet_number", "username", "purpose")
+
+
+def parse_rows(rows: Iterable[dict]) -> Tuple[List[tuple], List[dict]]:
+    """Приводит строки к типам; строки с ошибками сразу уходят в отчёт"""
+    records, errors = [], []
+    for row_no, row in enumerate(rows, start=1):
+        try:
+            slot = int(row["pair"])
+            if slot not in PAIR_TIMES:
+                raise ValueError(f"неизвестный номер пары {slot}")
+            records.append((
+                row_no,
+                date.fromisoformat(str(row["date"]).strip()),
+                slot,
+                int(row["cabinet"]),
+                str(row["username"]).strip(),
+                row.get("purpose") or None,
+            ))
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append({"row": row_no, "error": f"некорректная строка: {e}"})
+    return records, errors
+
+
+def read_rows(data: bytes, content_type: str) -> List[dict]:
+    if "json" in content_type:
+        return json.loads(data)
+    return list(csv.DictReader(io.StringIO(data.decode("utf-8-sig"))))
+
+
+async def import_timetable(conn, rows: Iterable[dict]) -> dict:
+    """Импортирует расписание через asyncpg-соединение conn одной транзакцией"""
+    records, errors = parse_rows(rows)
+    total = len(records) + len(errors)
+    if records:
+        days = [r[1] for r in records]
+        await ensure_partitions(conn.execute, min(days), max(days))
+
+    async with conn.transaction():
+        # Конкурентные бронирования ждут окончания импорта, а не теряются
+        await conn.execute("LOCK TABLE Pairs_Cabinets IN SHARE ROW EXCLUSIVE MODE")
+        await conn.execute("""
+            CREATE TEMP TABLE import_rows (
+                row_no INTEGER,
+                date DATE,
+                slot SMALLINT,
+                cabinet_number INTEGER,
+                username TEXT,
+                purpose TEXT
+            ) ON COMMIT DROP
+        """)
+        await conn.copy_records_to_table("import_rows", records=records, columns=STAGING_COLUMNS)
+
+        await conn.execute(f"""
+            CREATE TEMP TABLE import_resolved ON COMMIT DROP AS
+            WITH {SLOTS_CTE}
+            SELECT r.row_no, r.date, r.slot, s.start_time, s.end_time,
+                   c.id AS cabinet_id, u.id AS user_id, u.priority, r.purpose,
+                   CASE
+                       WHEN c.id IS NULL THEN 'кабинет ' || r.cabinet_number || ' не найден'
+                       WHEN u.id IS NULL THEN 'пользователь ' || r.username || ' не найден'
+                   END AS error
+            FROM import_rows r
+            JOIN slots s ON s.slot = r.slot
+            LEFT JOIN Cabinets c ON c.number = r.cabinet_number
+            LEFT JOIN Users u ON u.username = r.username
+        """)
+
+        # Внутри файла на один кабинет и пару побеждает старший приоритет
+        await conn.execute("""
+            UPDATE import_resolved r
+            SET error = 'пересекается со строкой ' || w.winner
+            FROM (
+                SELECT row_no, first_value(row_no) OVER (
+                    PARTITION BY date, slot, cabinet_id
+                    ORDER BY priority DESC, row_no
+                ) AS winner
+                FROM import_resolved
+                WHERE error IS NULL
+            ) w
+            WHERE r.row_no = w.row_no AND w.winner <> w.row_no
+        """)
+
+        # Существующую бронь можно вытеснить только строго большим приоритетом
+        await conn.execute("""
+            UPDATE import_resolved r
+            SET error = 'Недостаточно прав для изменения этой брони'
+            FROM Pairs_Cabinets pc
+            JOIN Pairs p ON p.id = pc.pair_id AND p.date = pc.date
+            JOIN Users u ON u.id = pc.user_id
+            WHERE r.error IS NULL
+            AND pc.cabinet_id = r.cabinet_id
+            AND pc.date = r.date
+            AND p.date = r.date
+            AND p.slot = r.slot
+            AND u.priority >= r.priority
+        """)
+
+        preempted = await conn.fetchval("""
+            WITH deleted AS (
+                DELETE FROM Pairs_Cabinets pc
+                USING Pairs p, import_resolved r
+                WHERE p.id = pc.pair_id
+                AND p.date = pc.date
+                AND r.error IS NULL
+                AND pc.cabinet_id = r.cabinet_id
+                AND pc.date = r.date
+                AND p.date = r.date
+                AND p.slot = r.slot
+                RETURNING 1
+            )
+            SELECT count(*) FROM deleted
+        """)
+
+        await conn.execute("""
+            INSERT INTO Pairs (date, slot, start_time, end_time)
+            SELECT DISTINCT r.date, r.slot, r.start_time, r.end_time
+            FROM import_resolved r
+            WHERE r.error IS NULL
+            ON CONFLICT (date, slot) DO NOTHING
+        """)
+
+        imported = await conn.fetchval("""
+            WITH inserted AS (
+                INSERT INTO Pairs_Cabinets (pair_id, date, cabinet_id, user_id, purpose)
+                SELECT p.id, p.date, r.cabinet_id, r.user_id, r.purpose
+                FROM import_resolved r
+                JOIN Pairs p ON p.date = r.date AND p.slot = r.slot
+                WHERE r.error IS NULL
+                RETURNING 1
+            )
+            SELECT count(*) FROM inserted
+        """)
+
+        rejected = await conn.fetch(
+            "SELECT row_no, error FROM import_resolved WHERE error IS NOT NULL"
+        )
+
+    errors.extend({"row": r["row_no"], "error": r["error"]} for r in rejected)
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "total": total,
+        "imported": imported,
+        "preempted": preempted,
+        "errors": errors,
+    }
+
+
+async def main(path: str):
+    import asyncpg
+    from config import get_db_url
+
+    with open(path, "rb") as f:
+        rows = read_rows(f.read(), "application/json" if path.endswith(".json") else "text/csv")
+    conn = await asyncpg.connect(get_db_url().replace("+asyncpg", ""))
+    try:
+        report = await import_timetable(conn, rows)
+    finally:
+        await conn.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1]))
@@ -0,0 +1,126 @@
+"""Загрузка кабинетов за период: куб NumPy и отчёт по нему.
+
+Брони периода приходят из базы уже сгруппированными по (этаж, тип
+кабинета, день недели, пара, user_priority) и раскладываются в массив
+booked[этаж, тип, день недели, пара, приоритет]. Ёмкость — число
+кабинетов этажа и типа, умноженное на число таких дней недели в периоде;
+разрезы отчёта — суммы куба по остальным осям, без циклов по строкам.
+"""
+from datetime import date
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from occupancy import PAIR_TIMES
+
+# Значения enum user_priority в порядке возрастания
+PRIORITIES = ("prostoi-smertni", "union", "prepod", "dispetcher")
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+SLOTS = len(PAIR_TIMES)
+
+# Строки в порядке CubeRow; кабинеты без броней приходят с NULL в колонках броней
+CUBE_SQL = """
+    WITH rooms AS (
+        SELECT floor, type, count(*) AS cabinets
+        FROM Cabinets
+        GROUP BY floor, type
+    ),
+    booked AS (
+        SELECT c.floor, c.type,
+               extract(isodow FROM pc.date)::int - 1 AS weekday,
+               p.slot,
+               u.priority::text AS priority,
+               count(*) AS bookings
+        FROM Pairs_Cabinets pc
+        JOIN Pairs p ON p.id = pc.pair_id AND p.date = pc.date
+        JOIN Cabinets c ON c.id = pc.cabinet_id
+        JOIN Users u ON u.id = pc.user_id
+        WHERE pc.date BETWEEN :start AND :end AND p.date BETWEEN :start AND :end
+        GROUP BY 1, 2, 3, 4, 5
+    )
+    SELECT r.floor, r.type, r.cabinets, b.weekday, b.slot, b.priority, b.bookings
+    FROM rooms r
+    LEFT JOIN booked b ON b.floor = r.floor AND b.type = r.type
+"""
+
+
+class CubeRow(NamedTuple):
+    floor: int
+    type: str
+    cabinets: int
+    weekday: int
+    slot: int
+    priority: str
+    bookings: int
+
+
+class Cube(NamedTuple):
+    floors: List[int]
+    types: List[str]
+    booked: np.ndarray    # (этажи, типы, 7, SLOTS, приоритеты)
+    capacity: np.ndarray  # (этажи, типы, 7, SLOTS)
+
+
+def weekday_counts(start: date, end: date) -> np.ndarray:
+    """Сколько раз каждый день недели встречается в [start, end]"""
+    days = (end - start).days + 1
+    return np.bincount((start.weekday() + np.arange(days)) % 7, minlength=7)
+
+
+def build_cube(rows: Sequence[tuple], start: date, end: date) -> Cube:
+    rows = [CubeRow(*row) for row in rows]
+    floors = sorted({r.floor for r in rows})
+    types = sorted({r.type for r in rows})
+    floor_index = {floor: i for i, floor in enumerate(floors)}
+    type_index = {t: i for i, t in enumerate(types)}
+    priority_index = {p: i for i, p in enumerate(PRIORITIES)}
+
+    rooms = np.zeros((len(floors), len(types)), dtype=np.int64)
+    for r in rows:
+        rooms[floor_index[r.floor], type_index[r.type]] = r.cabinets
+    capacity = (rooms[:, :, None, None] * weekday_counts(start, end)[None, None, :, None]
+                * np.ones(SLOTS, dtype=np.int64))
+
+    booked = np.zeros((len(floors), len(types), 7, SLOTS, len(PRIORITIES)), dtype=np.int64)
+    facts = [r for r in rows if r.bookings is not None]
+    if facts:
+        index = np.array([
+            (floor_index[r.floor], type_index[r.type], r.weekday, r.slot - 1, priority_index[r.priority])
+            for r in facts
+        ]).T
+        np.add.at(booked, tuple(index), [r.bookings for r in facts])
+    return Cube(floors, types, booked, capacity)
+
+
+def _breakdown(booked: np.ndarray, capacity: np.ndarray, labels: Sequence, name: str) -> List[dict]:
+    """booked (n, приоритеты) и capacity (n,) -> строки отчёта по одной оси"""
+    totals = booked.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(capacity > 0, totals / capacity, 0.0)
+    return [
+        {
+            name: label,
+            "capacity": int(capacity[i]),
+            "booked": int(totals[i]),
+            "utilization": round(float(ratio[i]), 4),
+            "by_priority": dict(zip(PRIORITIES, booked[i].tolist())),
+        }
+        for i, label in enumerate(labels)
+    ]
+
+
+def report(cube: Cube) -> Dict[str, object]:
+    booked, capacity = cube.booked, cube.capacity
+    axes = {
+        "floor": (0, cube.floors),
+        "type": (1, cube.types),
+        "weekday": (2, WEEKDAYS),
+        "slot": (3, list(range(1, SLOTS + 1))),
+    }
+    total = _breakdown(booked.sum(axis=(0, 1, 2, 3))[None, :], np.array([capacity.sum()]),
+                       ["all"], "scope")[0]
+    result: Dict[str, object] = {"total": total}
+    for name, (axis, labels) in axes.items():
+        others = tuple(a for a in range(4) if a != axis)
+        result[f"by_{name}"] = _breakdown(booked.sum(axis=others), capacity.sum(axis=others), labels, name)
+    return result
@@ -3,6 +3,9 @@ import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 
+// Импорт шлёт событие на каждую бронь: перечитываем один раз после паузы в потоке
+const REFETCH_DELAY_MS = 300;
+
 function RoomList() {
   const [rooms, setRooms] = useState([]);
   const [selectedDate, setSelectedDate] = useState('');
@@ -33,6 +36,33 @@ function RoomList() {
     fetchRooms();
   }, [selectedDate, selectedPair]);
 
+  useEffect(() => {
+    // Список свободных кабинетов обновляется по событиям сервера, без опроса
+    if (!selectedDate || !selectedPair) return;
+    const events = new EventSource('/api/events/bookings');
+    let timer = null;
+    let opened = false;
+    const refetchSoon = () => {
+      clearTimeout(timer);
+      timer = setTimeout(fetchRooms, REFETCH_DELAY_MS);
+    };
+    events.addEventListener('open', () => {
+      // После переподключения события за время разрыва потеряны
+      if (opened) refetchSoon();
+      opened = true;
+    });
+    events.addEventListener('booking', (e) => {
+      const change = JSON.parse(e.data);
+      if (change.date === selectedDate && String(change.slot) === String(selectedPair)) {
+        refetchSoon();
+      }
+    });
+    return () => {
+      clearTimeout(timer);
+      events.close();
+    };
+  }, [selectedDate, selectedPair]);
+
   const fetchRooms = async () => {
     try {
       setLoading(true);
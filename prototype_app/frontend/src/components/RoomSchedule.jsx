@@ -3,6 +3,9 @@ import { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 
+// Импорт шлёт событие на каждую бронь: перечитываем один раз после паузы в потоке
+const REFETCH_DELAY_MS = 300;
+
 function RoomSchedule() {
   const { id } = useParams();
   const navigate = useNavigate();
@@ -53,6 +56,33 @@ function RoomSchedule() {
     }
   }, [id, selectedDate]);
 
+  useEffect(() => {
+    // Перечитываем расписание, только когда сервер сообщил об изменении на этой неделе
+    if (!weekDates.length) return;
+    const events = new EventSource(`/api/events/bookings?cabinet_id=${id}`);
+    let timer = null;
+    let opened = false;
+    const refetchSoon = () => {
+      clearTimeout(timer);
+      timer = setTimeout(fetchSchedule, REFETCH_DELAY_MS);
+    };
+    events.addEventListener('open', () => {
+      // После переподключения события за время разрыва потеряны
+      if (opened) refetchSoon();
+      opened = true;
+    });
+    events.addEventListener('booking', (e) => {
+      const change = JSON.parse(e.data);
+      if (weekDates.includes(change.date)) {
+        refetchSoon();
+      }
+    });
+    return () => {
+      clearTimeout(timer);
+      events.close();
+    };
+  }, [id, weekDates]);
+
   const fetchRoomData = async () => {
     try {
       const response = await fetch(`/api/cabinets/${id}`);
@@ -143,6 +173,7 @@ function RoomSchedule() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Authorization': `Bearer ${user.token}`,
         },
         body: JSON.stringify({
           pair_id: pairData.id,